@@ -19,7 +19,10 @@ from PyQt5.QtWidgets import (QComboBox,
                             QScrollArea)
 
 from spare_manager import config_blender as blender
+from spare_manager import profiling
+from spare_manager.compare_configuration import PropertyDiffWindow
 from spare_manager.model import SpareModel
+from spare_manager.status_configuration import SpareManagerWindow as StatusWindow
 
 DB_INSTANCE = 'pro'
 DeviceData = namedtuple('DeviceData', 'name, class_id, gateway, dongle')
@@ -48,13 +51,19 @@ class SpareManagerWindow(QMainWindow):
         super().__init__(parent)
 
         self._display_config_logger = None
-        self.ui = uic.loadUi(Path(__file__).parent / 'activate_config_view.ui', self)
-        self._model = SpareModel()
+        with profiling.stage('Load UI'):
+            self.ui = uic.loadUi(Path(__file__).parent / 'activate_config_view.ui', self)
+
+        with profiling.stage('Build device model'):
+            self._model = SpareModel()
+
         self.ui.operationalfgcComboBox.setModel(self._model)
 
         self._op_device = None
         self._spare_device = None
         self._combo_name = None
+        self._status_window = None
+        self._property_diff_window = None
         self._set_signals_slots()
 
         self.setWindowTitle('Spare system manager - Existing configurations')
@@ -68,6 +77,8 @@ class SpareManagerWindow(QMainWindow):
         self.ui.activateconfigPushButton.clicked.connect(lambda: self._activate_configuration(self._combo_name))
         self.ui.deactivateconfigPushButton.clicked.connect(lambda: self._deactivate_configuration(self._combo_name))
         self.ui.deleteconfigPushButton.clicked.connect(lambda: self._delete_combo_system(self._combo_name))
+        self.ui.statusPushButton.clicked.connect(lambda: self._show_status_window())
+        self.ui.propertiesPushButton.clicked.connect(lambda: self._show_property_diff_window())
 
         self._create_activity_box()
 
@@ -78,6 +89,10 @@ class SpareManagerWindow(QMainWindow):
         logging.getLogger().addHandler(self._display_config_logger)
         logging.getLogger().setLevel(logging.INFO)
 
+        # Timings recorded before the activity box existed, e.g. the name file parsing
+        profiling.flush()
+
+    @profiling.timed('Load device')
     def _load_device(self, device, device_role):
         device_upper = device.upper()
 
@@ -102,10 +117,11 @@ class SpareManagerWindow(QMainWindow):
             spares.sort()
             self.ui.relatedsparesComboBox.addItems(spares)
         
-        except FileNotFoundError as fe:
-            self._show_error_popup_window(str(fe))
-            logging.info(f'Could not load spare systems that have been combined with the operational FGC! {fe}')
+        except (FileNotFoundError, RuntimeError) as e:
+            self._show_error_popup_window(str(e))
+            logging.info(f'Could not load spare systems that have been combined with the operational FGC! {e}')
 
+    @profiling.timed('Delete configuration')
     def _delete_combo_system(self, system_combo_name):
         if not system_combo_name:
             msg = 'Cannot delete empty operational-spare combination'
@@ -118,7 +134,7 @@ class SpareManagerWindow(QMainWindow):
         try:
             blender.delete_combo_system(op, spare, DB_INSTANCE)
 
-        except (KeyError, FileNotFoundError) as e:
+        except (KeyError, FileNotFoundError, RuntimeError) as e:
             self._show_error_popup_window(str(e))
 
         else:
@@ -133,13 +149,20 @@ class SpareManagerWindow(QMainWindow):
             logging.info(msg)
             return
 
-        system_id = blender.get_system_id(system_combo_name, DB_INSTANCE)
+        try:
+            system_id = blender.get_system_id(system_combo_name, DB_INSTANCE)
+
+        except (FileNotFoundError, RuntimeError) as e:
+            self._show_error_popup_window(str(e))
+            system_id = None
+
         if isinstance(system_id, int):
             logging.info(f'Link to the property manager: \nhttps://accwww.cern.ch/fgc_property_manager/details/system?id={system_id}')
 
         else:
             logging.error(f'Could not get system id for system: {system_combo_name}')
 
+    @profiling.timed('Activate configuration')
     def _activate_configuration(self, system_combo_name):
         if not system_combo_name:
             msg = 'Cannot activate empty operational-spare combination'
@@ -156,6 +179,7 @@ class SpareManagerWindow(QMainWindow):
         else:
             logging.info(f'Configuration {system_combo_name} has been activated')
 
+    @profiling.timed('Deactivate configuration')
     def _deactivate_configuration(self, system_combo_name):
         if not system_combo_name:
             msg = 'Cannot deactivate empty operational-spare combination'
@@ -172,6 +196,30 @@ class SpareManagerWindow(QMainWindow):
         else:
             logging.info(f'Configuration {system_combo_name} has been deactivated')
 
+    def _show_status_window(self):
+        if self._status_window is None:
+            self._status_window = StatusWindow(db_instance=DB_INSTANCE)
+
+        else:
+            self._status_window.refresh()
+            self._status_window.show()
+            self._status_window.raise_()
+
+    def _show_property_diff_window(self):
+        if not self._combo_name:
+            msg = 'Cannot show properties of empty operational-spare combination'
+            self._show_error_popup_window(msg)
+            logging.info(msg)
+            return
+
+        if self._property_diff_window is None:
+            self._property_diff_window = PropertyDiffWindow(self._op_device.name, self._spare_device.name, db_instance=DB_INSTANCE)
+
+        else:
+            self._property_diff_window.load(self._op_device.name, self._spare_device.name)
+            self._property_diff_window.show()
+            self._property_diff_window.raise_()
+
     def _show_error_popup_window(self, message):
         msg = QMessageBox()
         msg.setWindowTitle('This is not good...')
@@ -0,0 +1,187 @@
+"""Asyncio facade for the config_blender operations.
+
+Every coroutine runs its blocking config_blender counterpart on a bounded thread pool. The
+number of worker threads matches the sessions available in the config_blender session pools,
+so one event loop can drive many spare operations while the number of database connections
+stays fixed. On top of that, the operations targeting a given database instance are limited
+by a limiter (see set_concurrency_limit).
+
+An operation cancelled while it waits for its turn never reaches the database. An operation
+cancelled while it already runs is left to finish in its worker thread: the awaiting task is
+cancelled straight away, but the transaction is either committed or rolled back as a whole
+(within the operation budget of config_blender). Its slot is only given back once the worker
+thread is done with its database session.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from spare_manager import config_blender as blender
+from spare_manager import spare_allocator
+
+_executor = None
+_executor_lock = threading.Lock()
+_concurrency_limits = dict()
+_limiters = dict()
+
+class _ConcurrencyLimiter:
+    """Admits at most limit operations of an event loop at once. The limit can change at any time."""
+    def __init__(self, limit, loop):
+        self.limit = limit
+        self.running = 0
+        self._loop = loop
+        self._waiters = list()
+
+    async def acquire(self):
+        while self.running >= self.limit:
+            waiter = self._loop.create_future()
+            self._waiters.append(waiter)
+
+            try:
+                await waiter
+
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self._wake_up()
+
+    def set_limit(self, limit):
+        """Can be called from any thread."""
+        self.limit = limit
+        self._loop.call_soon_threadsafe(self._wake_up)
+
+    def _wake_up(self):
+        # Every waiter checks the limit again, so none can be lost to a cancellation
+        waiters, self._waiters = self._waiters, list()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            max_workers = sum(blender.get_pool_size(db_instance) for db_instance in blender._db_conn_strings)
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='spare_manager_db')
+
+        return _executor
+
+def _get_limiter(db_instance: str) -> _ConcurrencyLimiter:
+    db_instance_lc = db_instance.lower()
+    loop = asyncio.get_event_loop()
+
+    try:
+        limiter_loop, limiter = _limiters[db_instance_lc]
+
+    except KeyError:
+        limiter_loop = limiter = None
+
+    if limiter_loop is not loop:
+        limit = _concurrency_limits.get(db_instance_lc, blender.get_pool_size(db_instance_lc))
+        limiter = _ConcurrencyLimiter(limit, loop)
+        _limiters[db_instance_lc] = (loop, limiter)
+
+    return limiter
+
+def set_concurrency_limit(db_instance: str, limit: int) -> None:
+    """Sets the maximum number of operations running at once against db_instance.
+
+    The limit cannot exceed the size of the instance's session pool. It also applies to an
+    event loop already using the instance: when it is lowered, the operations running carry
+    on, and no new one starts until fewer than limit are left.
+    """
+    try:
+        blender._db_conn_strings[db_instance.lower()]
+
+    except KeyError as ke:
+        possible_values = ', '.join([k for k in blender._db_conn_strings.keys()])
+        raise KeyError(f'Database instance {db_instance} not valid! Possible values: {possible_values}') from ke
+
+    pool_size = blender.get_pool_size(db_instance)
+    if not 0 < limit <= pool_size:
+        raise ValueError(f'Concurrency limit for {db_instance} must be between 1 and {pool_size}')
+
+    _concurrency_limits[db_instance.lower()] = limit
+
+    limiter_loop, limiter = _limiters.get(db_instance.lower(), (None, None))
+    if limiter is not None and not limiter_loop.is_closed():
+        limiter.set_limit(limit)
+
+async def _run(db_instance: str, func, *args):
+    limiter = _get_limiter(db_instance)
+    await limiter.acquire()
+
+    try:
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(_get_executor(), functools.partial(func, *args))
+
+    except BaseException:
+        limiter.release()
+        raise
+
+    # The slot is given back when the worker thread is done, not when the awaiting task is
+    # cancelled: until then the worker still holds a pooled session
+    future.add_done_callback(lambda _: limiter.release())
+    return await asyncio.shield(future)
+
+async def create_op_spare_combo_system(operational: str, spare: str, db_instance: str) -> int:
+    return await _run(db_instance, blender.create_op_spare_combo_system, operational, spare, db_instance)
+
+async def plan_op_spare_combo_system(operational: str, spare: str, db_instance: str) -> 'blender.OperationPlan':
+    return await _run(db_instance, blender.plan_op_spare_combo_system, operational, spare, db_instance)
+
+async def plan_resync_combo_system(operational: str, spare: str, db_instance: str) -> 'blender.OperationPlan':
+    return await _run(db_instance, blender.plan_resync_combo_system, operational, spare, db_instance)
+
+async def execute_plan(plan: 'blender.OperationPlan') -> int:
+    return await _run(plan.db_instance, blender.execute_plan, plan)
+
+async def delete_combo_system(operational: str, spare: str, db_instance: str) -> None:
+    return await _run(db_instance, blender.delete_combo_system, operational, spare, db_instance)
+
+async def resync_combo_system(operational: str, spare: str, db_instance: str) -> int:
+    return await _run(db_instance, blender.resync_combo_system, operational, spare, db_instance)
+
+async def activate_configuration(combo_system_name: str, db_instance: str) -> None:
+    return await _run(db_instance, blender.activate_configuration, combo_system_name, db_instance)
+
+async def deactivate_configuration(combo_system_name: str, db_instance: str) -> None:
+    return await _run(db_instance, blender.deactivate_configuration, combo_system_name, db_instance)
+
+async def get_combo_systems(db_instance: str) -> list:
+    return await _run(db_instance, blender._get_combo_systems, db_instance)
+
+async def get_combo_property_diff(operational: str, spare: str, db_instance: str) -> list:
+    return await _run(db_instance, blender.get_combo_property_diff, operational, spare, db_instance)
+
+async def recommend_spares(operational: str, db_instance: str) -> list:
+    return await _run(db_instance, spare_allocator.recommend_spares, operational, db_instance)
+
+async def get_spare_status(db_instance: str) -> list:
+    return await _run(db_instance, blender.get_spare_status, db_instance)
+
+async def get_spare_systems_from_operational(operational, db_instance: str) -> list:
+    return await _run(db_instance, blender.get_spare_systems_from_operational, operational, db_instance)
+
+async def get_system_id(combo_system_name: str, db_instance: str) -> int:
+    return await _run(db_instance, blender.get_system_id, combo_system_name, db_instance)
+
+def shutdown() -> None:
+    """Waits for the running operations to finish and closes the session pools."""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+    blender.close_session_pools()
+
+# EOF
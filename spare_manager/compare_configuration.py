@@ -0,0 +1,89 @@
+import logging
+import time
+
+from PyQt5.QtWidgets import QMainWindow, QWidget
+from PyQt5.QtWidgets import QVBoxLayout
+from PyQt5.QtWidgets import (QAbstractItemView,
+                            QCheckBox,
+                            QHeaderView,
+                            QMessageBox,
+                            QTableView)
+
+from spare_manager import config_blender as blender
+from spare_manager import profiling
+from spare_manager.model import PropertyDiffModel
+
+DB_INSTANCE = 'pro'
+
+class PropertyDiffWindow(QMainWindow):
+    """Side by side view of the operational, spare and combo system properties.
+
+    Arguments:
+        QMainWindow {[type]} -- [description]
+    """
+    def __init__(self, operational, spare, parent=None, db_instance=DB_INSTANCE):
+        super().__init__(parent)
+
+        self._db_instance = db_instance
+        self._prop_diffs = list()
+        self._model = PropertyDiffModel()
+
+        self._build_widgets()
+
+        self.resize(800, 600)
+        self.show()
+
+        self.load(operational, spare)
+
+    def _build_widgets(self):
+        self.mismatchesonlyCheckBox = QCheckBox('Show only combo values differing from their source')
+        self.mismatchesonlyCheckBox.toggled.connect(lambda checked: self._show_rows())
+
+        self.propertiesTableView = QTableView()
+        self.propertiesTableView.setModel(self._model)
+        self.propertiesTableView.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.propertiesTableView.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.propertiesTableView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+        main_layout = QVBoxLayout()
+        main_layout.addWidget(self.mismatchesonlyCheckBox)
+        main_layout.addWidget(self.propertiesTableView)
+
+        central_widget = QWidget()
+        central_widget.setLayout(main_layout)
+        self.setCentralWidget(central_widget)
+
+    @profiling.timed('Compare configuration properties')
+    def load(self, operational, spare):
+        self.setWindowTitle(f'Spare system manager - Properties of {operational} with spare {spare}')
+        start = time.perf_counter()
+
+        try:
+            self._prop_diffs = blender.get_combo_property_diff(operational, spare, self._db_instance)
+
+        except (FileNotFoundError, RuntimeError) as e:
+            self._prop_diffs = list()
+            self._show_error_popup_window(str(e))
+            logging.info(f'Could not load the properties of the operational-spare configuration! {e}')
+
+        self._show_rows()
+
+        mismatches = sum(1 for p in self._prop_diffs if not p.matches)
+        msg = f'{len(self._prop_diffs)} properties, {mismatches} combo values differing from their source (loaded in {time.perf_counter() - start:.2f} s)'
+        self.statusBar().showMessage(msg)
+        logging.info(msg)
+
+    def _show_rows(self):
+        if self.mismatchesonlyCheckBox.isChecked():
+            self._model.setRows([p for p in self._prop_diffs if not p.matches])
+
+        else:
+            self._model.setRows(self._prop_diffs)
+
+    def _show_error_popup_window(self, message):
+        msg = QMessageBox()
+        msg.setWindowTitle('This is not good...')
+        msg.setText(message)
+        _ = msg.exec_()
+
+# EOF
@@ -7,8 +7,14 @@ to take from the operational and spare systems, respectively, looking at the pro
 argument 'from_spare_converter=1'.
 """
 import argparse
+import itertools
+import logging
+import random
 import sys
+import threading
+import time
 from collections import namedtuple
+from contextlib import contextmanager
 from pathlib import Path
 
 import cx_Oracle
@@ -16,6 +22,10 @@ import cx_Oracle
 import pyfgc_name
 from fgc import properties
 
+from spare_manager import profiling
+from spare_manager import replica
+from spare_manager.device_table import get_device_table
+
 
 DB_USER = "POCONTROLS_MOD"
 PWD_DIR = '/user/pclhc/etc/program_manager/private/'
@@ -31,6 +41,23 @@ PRO_DSN = '''(DESCRIPTION=(ADDRESS=(PROTOCOL=TCP)(HOST=acccon-s.cern.ch)(PORT=10
            (CONNECT_DATA = (SERVICE_NAME = acccon_s.cern.ch)))
            '''
 
+DB_POOL_MIN_SESSIONS = 1
+DB_POOL_MAX_SESSIONS = 4
+
+# Timeouts in seconds, per database instance: connect covers opening sessions and waiting for a
+# free one in the pool, call and commit each round trip, and operation the whole of a
+# high-level operation (its latency budget), after which the statement in flight is cancelled
+DbTimeouts = namedtuple('DbTimeouts', 'connect, call, commit, operation')
+
+DEFAULT_DB_TIMEOUTS = DbTimeouts(connect=5, call=10, commit=5, operation=30)
+
+LOCK_WAIT_SECONDS = 0
+LOCK_RETRIES = 3
+LOCK_RETRY_BACKOFF_SECONDS = 0.2
+
+BULK_FETCH_ARRAYSIZE = 1000
+BULK_FETCH_MAX_NAMES = 1000
+
 UPDATE_DEVICE_SPARE_ID = '''
 UPDATE FGC_SYSTEM_PROPERTIES fsp
 SET SPR_VALUE=:spare_id
@@ -48,6 +75,26 @@ WHERE SPR_ID=(
     fp.PRO_NAME=:property_name)
 '''
 
+LOCK_DEVICE_SPARE_ID = '''
+SELECT 
+  fsp.SPR_VALUE
+FROM 
+  FGC_SYSTEM_PROPERTIES fsp
+WHERE SPR_ID=(
+  SELECT 
+    fsp.SPR_ID 
+  FROM 
+    FGC_SYSTEM_PROPERTIES fsp 
+  INNER JOIN FGC_SYSTEMS fs 
+  ON fs.SYS_ID = fsp.SPR_SYS_ID 
+  INNER JOIN FGC_PROPERTIES fp 
+  ON fp.PRO_ID = fsp.SPR_PRO_ID 
+  WHERE 
+    fs.SYS_NAME=:operational_sys_name AND 
+    fp.PRO_NAME=:property_name)
+FOR UPDATE {wait_clause}
+'''
+
 INSERT_COMBO_SYSTEM = '''
 INSERT INTO FGC_SYSTEMS fs
 (SYS_NAME, SYS_TP_ID, SYS_CLASS_ID, SYS_IS_OBSOLETE, SYS_IS_SPARE_COMBINATION)
@@ -72,30 +119,24 @@ WHERE
   fs.SYS_NAME=:combo_sys_name
 '''
 
-LINK_SPARE_COMPONENTS_TO_COMBO_SYSTEM = '''
-INSERT INTO 
-FGC_COMPONENT_SYSTEMS fcs
-(fcs.CS_SYS_ID, fcs.CS_CMP_ID)
+GET_SYSTEM_PROPERTIES = '''
 SELECT 
-  (SELECT 
-    fs.SYS_ID 
-  FROM 
-    FGC_SYSTEMS fs 
-  WHERE 
-    fs.sys_name=:combo_sys_name) AS SYS_ID,
-    fcs.CS_CMP_ID
+  fp.PRO_NAME, 
+  fp.PRO_ID,
+  fsp.SPR_VALUE 
 FROM 
-  FGC_COMPONENT_SYSTEMS fcs 
+  FGC_PROPERTIES fp
+INNER JOIN FGC_SYSTEM_PROPERTIES fsp 
+ON fp.PRO_ID = fsp.SPR_PRO_ID
 INNER JOIN FGC_SYSTEMS fs 
-ON fs.SYS_ID = fcs.CS_SYS_ID
-INNER JOIN FGC_COMPONENTS fc 
-ON fc.CMP_ID = fcs.CS_CMP_ID
+ON fs.SYS_ID = fsp.SPR_SYS_ID 
 WHERE 
-  fs.SYS_NAME=:spare_sys_name
+  fs.SYS_NAME=:system_name
 '''
 
-GET_SYSTEM_PROPERTIES = '''
+GET_SYSTEMS_PROPERTIES = '''
 SELECT 
+  fs.SYS_NAME,
   fp.PRO_NAME, 
   fp.PRO_ID,
   fsp.SPR_VALUE 
@@ -106,7 +147,10 @@ ON fp.PRO_ID = fsp.SPR_PRO_ID
 INNER JOIN FGC_SYSTEMS fs 
 ON fs.SYS_ID = fsp.SPR_SYS_ID 
 WHERE 
-  fs.SYS_NAME=:system_name
+  fs.SYS_NAME IN (SELECT COLUMN_VALUE FROM TABLE(:system_names))
+ORDER BY 
+  fs.SYS_NAME ASC,
+  fp.PRO_NAME ASC
 '''
 
 DELETE_COMPONENTS_FROM_COMBO_SYSTEM = '''
@@ -140,6 +184,50 @@ VALUES
 (:1, :2, :3)
 '''
 
+MERGE_SYSTEM_PROPERTY = '''
+MERGE INTO FGC_SYSTEM_PROPERTIES fsp
+USING (SELECT :1 AS SYS_ID, :2 AS PRO_ID, :3 AS VALUE FROM DUAL) src
+ON (fsp.SPR_SYS_ID = src.SYS_ID AND fsp.SPR_PRO_ID = src.PRO_ID)
+WHEN MATCHED THEN 
+  UPDATE SET fsp.SPR_VALUE = src.VALUE
+WHEN NOT MATCHED THEN 
+  INSERT (SPR_SYS_ID, SPR_PRO_ID, SPR_VALUE) VALUES (src.SYS_ID, src.PRO_ID, src.VALUE)
+'''
+
+DELETE_SYSTEM_PROPERTY = '''
+DELETE FROM FGC_SYSTEM_PROPERTIES fsp
+WHERE 
+  fsp.SPR_SYS_ID = :1 AND 
+  fsp.SPR_PRO_ID = :2
+'''
+
+GET_SYSTEM_COMPONENTS = '''
+SELECT 
+  fcs.CS_CMP_ID
+FROM 
+  FGC_COMPONENT_SYSTEMS fcs 
+INNER JOIN FGC_SYSTEMS fs 
+ON fs.SYS_ID = fcs.CS_SYS_ID
+INNER JOIN FGC_COMPONENTS fc 
+ON fc.CMP_ID = fcs.CS_CMP_ID
+WHERE 
+  fs.SYS_NAME=:system_name
+'''
+
+LINK_COMPONENT_TO_SYSTEM = '''
+INSERT INTO FGC_COMPONENT_SYSTEMS
+(CS_SYS_ID, CS_CMP_ID)
+VALUES
+(:1, :2)
+'''
+
+UNLINK_COMPONENT_FROM_SYSTEM = '''
+DELETE FROM FGC_COMPONENT_SYSTEMS fcs
+WHERE 
+  fcs.CS_SYS_ID = :1 AND 
+  fcs.CS_CMP_ID = :2
+'''
+
 GET_SPARE_SYSTEMS = '''
 SELECT
   fs.SYS_NAME
@@ -160,7 +248,56 @@ WHERE
   fs.SYS_NAME=:system_name
 '''
 
+GET_SPARE_STATUS = '''
+WITH combo AS (
+  SELECT
+    fs.SYS_ID,
+    SUBSTR(fs.SYS_NAME, 1, INSTR(fs.SYS_NAME, '_', -1) - 1) AS OP_SYS_NAME,
+    SUBSTR(fs.SYS_NAME, INSTR(fs.SYS_NAME, '_', -1) + 1) AS SPARE_ID
+  FROM 
+    FGC_SYSTEMS fs 
+  WHERE 
+    fs.SYS_IS_SPARE_COMBINATION = 1)
+SELECT
+  combo.OP_SYS_NAME,
+  combo.SPARE_ID,
+  combo.SYS_ID,
+  CASE WHEN LPAD(TRIM(fsp.SPR_VALUE), 2, '0') = combo.SPARE_ID THEN 1 ELSE 0 END AS ACTIVE
+FROM 
+  combo
+LEFT JOIN FGC_SYSTEMS fs 
+ON fs.SYS_NAME = combo.OP_SYS_NAME
+LEFT JOIN FGC_PROPERTIES fp 
+ON fp.PRO_NAME = 'DEVICE.SPARE_ID'
+LEFT JOIN FGC_SYSTEM_PROPERTIES fsp 
+ON fsp.SPR_SYS_ID = fs.SYS_ID AND fsp.SPR_PRO_ID = fp.PRO_ID
+ORDER BY 
+  combo.OP_SYS_NAME ASC, 
+  combo.SPARE_ID ASC
+'''
+
+Property = namedtuple('Property', 'id, name, value')
+SpareStatus = namedtuple('SpareStatus', 'operational, spare, combo_sys_id, active')
+PropertyDiff = namedtuple('PropertyDiff', 'name, operational, spare, combo, source, matches')
+
+PROPERTY_SOURCE_OPERATIONAL = 'operational'
+PROPERTY_SOURCE_SPARE       = 'spare'
+
+# ORA-00054 (NOWAIT) and ORA-30006 (WAIT n): the row is locked by another session
+_ORA_RESOURCE_BUSY_CODES = (54, 30006)
+# ORA-01013: call cancelled, ORA-12170/ORA-03136: connect timeout, ORA-24457: no free session in the pool in time
+_ORA_TIMEOUT_CODES = (1013, 12170, 3136, 24457)
+# DPI-1067: call timeout exceeded, DPI-1080: connection closed after a call timeout
+_DPI_TIMEOUT_PREFIXES = ('DPI-1067', 'DPI-1080')
+
 _db_conn_strings = {'dev': DEV_DSN, 'pro': PRO_DSN}
+_db_timeouts = {'dev': DEFAULT_DB_TIMEOUTS, 'pro': DEFAULT_DB_TIMEOUTS}
+_session_pools = dict()
+_session_pools_lock = threading.Lock()
+# id(connection) -> (expired event, operation timeout) of the connections held under a budget
+_operation_budgets = dict()
+# id(connection) -> object types already looked up, for the connections held through _db_connection
+_connection_types = dict()
 
 def _get_db_crendentials(db_instance):
     with open(Path(PWD_DIR) / db_instance.lower() / DB_USER.lower()) as pfh:
@@ -168,6 +305,226 @@ def _get_db_crendentials(db_instance):
 
     return secret
 
+def get_db_timeouts(db_instance: str) -> DbTimeouts:
+    return _db_timeouts[db_instance.lower()]
+
+def set_db_timeouts(db_instance: str, **timeouts) -> None:
+    """Changes some of the timeouts of db_instance, e.g. set_db_timeouts('pro', call=5).
+
+    The connect timeout only applies to session pools created afterwards.
+    """
+    db_instance_lc = db_instance.lower()
+    _db_timeouts[db_instance_lc] = _db_timeouts[db_instance_lc]._replace(**timeouts)
+
+def _get_dsn(db_instance_lc):
+    connect_timeout = int(_db_timeouts[db_instance_lc].connect)
+    timeouts = f'(CONNECT_TIMEOUT={connect_timeout})(TRANSPORT_CONNECT_TIMEOUT={connect_timeout})'
+    return _db_conn_strings[db_instance_lc].replace('(DESCRIPTION=', '(DESCRIPTION=' + timeouts, 1)
+
+class DbTimeoutError(RuntimeError):
+    """A database call, or a whole operation, did not complete in time."""
+
+def _is_timeout_error(oracle_error):
+    error = oracle_error.args[0] if oracle_error.args else None
+    message = str(getattr(error, 'message', error))
+    return getattr(error, 'code', None) in _ORA_TIMEOUT_CODES or message.startswith(_DPI_TIMEOUT_PREFIXES)
+
+def _expire_operation(db_connection, expired):
+    expired.set()
+    db_connection.cancel()
+
+def _check_operation_budget(db_connection, db_instance):
+    try:
+        expired, operation_timeout = _operation_budgets[id(db_connection)]
+
+    except KeyError:
+        return
+
+    if expired.is_set():
+        raise DbTimeoutError(f'Operation on {db_instance.upper()} database exceeded its {operation_timeout} s budget and was rolled back')
+
+def _commit(db_connection, db_instance):
+    """Commits, unless the operation budget of the connection has run out."""
+    _check_operation_budget(db_connection, db_instance)
+
+    timeouts = _db_timeouts[db_instance.lower()]
+    db_connection.callTimeout = int(timeouts.commit * 1000)
+
+    try:
+        db_connection.commit()
+
+    finally:
+        db_connection.callTimeout = int(timeouts.call * 1000)
+
+def _get_session_pool(db_instance: str) -> 'cx_Oracle.SessionPool':
+    db_instance_lc = db_instance.lower()
+
+    with _session_pools_lock:
+        try:
+            return _session_pools[db_instance_lc]
+
+        except KeyError:
+            secret = _get_db_crendentials(db_instance)
+            pool = cx_Oracle.SessionPool(DB_USER, secret, _get_dsn(db_instance_lc),
+                                         min=DB_POOL_MIN_SESSIONS,
+                                         max=DB_POOL_MAX_SESSIONS,
+                                         increment=1,
+                                         threaded=True,
+                                         getmode=cx_Oracle.SPOOL_ATTRVAL_TIMEDWAIT,
+                                         waitTimeout=int(_db_timeouts[db_instance_lc].connect * 1000))
+            _session_pools[db_instance_lc] = pool
+            return pool
+
+def get_pool_size(db_instance: str) -> int:
+    """Maximum number of sessions that can be open at once against db_instance."""
+    return DB_POOL_MAX_SESSIONS
+
+def close_session_pools() -> None:
+    with _session_pools_lock:
+        for pool in _session_pools.values():
+            pool.close(force=True)
+
+        _session_pools.clear()
+
+@contextmanager
+def _db_connection(db_instance: str, operation_timeout=None):
+    """Acquires a connection from the session pool of db_instance.
+
+    Every round trip is bounded by the instance's call timeout. If the connection is held longer
+    than operation_timeout seconds (default: the instance's operation timeout, 0 for no limit),
+    the statement in flight is cancelled and the operation is marked expired: _commit refuses
+    to commit it, and leaving the block raises. Timeouts are raised as DbTimeoutError.
+    Uncommitted work is rolled back when the connection goes back to the pool.
+    """
+    timeouts = _db_timeouts[db_instance.lower()]
+    operation_timeout = timeouts.operation if operation_timeout is None else operation_timeout
+
+    try:
+        with profiling.stage(f'Connect to {db_instance.upper()} database'):
+            pool = _get_session_pool(db_instance)
+            db_connection = pool.acquire()
+
+    except cx_Oracle.DatabaseError as de:
+        if _is_timeout_error(de):
+            raise DbTimeoutError(f'Could not connect to {db_instance.upper()} database within {timeouts.connect} s') from de
+
+        raise
+
+    db_connection.callTimeout = int(timeouts.call * 1000)
+    _connection_types[id(db_connection)] = dict()
+    budget_timer = None
+    expired = threading.Event()
+    if operation_timeout:
+        _operation_budgets[id(db_connection)] = (expired, operation_timeout)
+        budget_timer = threading.Timer(operation_timeout, _expire_operation, (db_connection, expired))
+        budget_timer.daemon = True
+        budget_timer.start()
+
+    try:
+        yield db_connection
+        _check_operation_budget(db_connection, db_instance)
+
+    except cx_Oracle.DatabaseError as de:
+        if not _is_timeout_error(de):
+            raise
+
+        if expired.is_set():
+            raise DbTimeoutError(f'Operation on {db_instance.upper()} database exceeded its {operation_timeout} s budget and was rolled back') from de
+
+        raise DbTimeoutError(f'Call to {db_instance.upper()} database did not complete within {timeouts.call} s and was rolled back') from de
+
+    finally:
+        if budget_timer is not None:
+            budget_timer.cancel()
+            _operation_budgets.pop(id(db_connection), None)
+
+        _connection_types.pop(id(db_connection), None)
+
+        try:
+            db_connection.rollback()
+
+        except cx_Oracle.Error:
+            pass
+
+        pool.release(db_connection)
+
+class OperationalBusyError(RuntimeError):
+    """Another operator is modifying the same operational FGC; retry later."""
+
+def _lock_operational(operational_sys_name, cursor):
+    wait_clause = 'NOWAIT' if LOCK_WAIT_SECONDS <= 0 else f'WAIT {int(LOCK_WAIT_SECONDS)}'
+    data_lock = {'operational_sys_name': operational_sys_name, 'property_name': 'DEVICE.SPARE_ID'}
+
+    try:
+        cursor.execute(LOCK_DEVICE_SPARE_ID.format(wait_clause=wait_clause), data_lock)
+
+    except cx_Oracle.DatabaseError as de:
+        error, = de.args
+        if getattr(error, 'code', None) in _ORA_RESOURCE_BUSY_CODES:
+            raise OperationalBusyError(f'Operational {operational_sys_name} is being modified by another operator: busy, retry later') from de
+
+        raise
+
+    # Without a DEVICE.SPARE_ID row there is nothing to lock: never go ahead unlocked
+    if cursor.fetchone() is None:
+        raise RuntimeError(f'Operational {operational_sys_name} has no DEVICE.SPARE_ID property to lock!')
+
+def _run_locked(operational_sys_name, db_instance, work):
+    """Runs work(cursor) in one short transaction holding the lock on the operational's DEVICE.SPARE_ID.
+
+    The lock is taken first, without queueing behind other sessions. If the operational is busy,
+    the transaction is retried up to LOCK_RETRIES times with exponential backoff before
+    OperationalBusyError is raised. Database errors are raised as RuntimeError.
+    """
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            with _db_connection(db_instance) as db_connection:
+                db_connection.autocommit = False
+
+                with db_connection.cursor() as cursor:
+                    _lock_operational(operational_sys_name, cursor)
+                    result = work(cursor)
+
+                _commit(db_connection, db_instance)
+                replica.invalidate(db_instance, [operational_sys_name])
+                return result
+
+        except OperationalBusyError:
+            if attempt == LOCK_RETRIES:
+                raise
+
+            time.sleep(LOCK_RETRY_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.0))
+
+        except cx_Oracle.Error as oe:
+            raise RuntimeError(str(oe)) from oe
+
+def _get_fresh_replica(db_instance):
+    """Returns the local replica of db_instance, refreshed if stale, or None to read from Oracle.
+
+    If the refresh fails, the last replicated data is served rather than failing the read. The
+    first population copies the whole slice: like replication, it has no operation budget, only
+    the per round trip call timeout.
+    """
+    local_replica = replica.get_replica(db_instance)
+    if local_replica is None or not local_replica.is_stale():
+        return local_replica
+
+    operation_timeout = None if local_replica.is_populated else 0
+
+    try:
+        with profiling.stage(f'Refresh {db_instance.upper()} replica'):
+            with _db_connection(db_instance, operation_timeout=operation_timeout) as db_connection:
+                with db_connection.cursor() as cursor:
+                    local_replica.refresh(cursor)
+
+    except (RuntimeError, cx_Oracle.Error) as e:
+        if not local_replica.is_populated:
+            raise
+
+        logging.info(f'Could not refresh the {db_instance.upper()} replica, serving the last replicated data: {e}')
+
+    return local_replica
+
 def _delete_components_from_combo_system(combo_sys_name, cursor):
     cursor.execute(DELETE_COMPONENTS_FROM_COMBO_SYSTEM, {'combo_sys_name':combo_sys_name})
     
@@ -182,7 +539,6 @@ def _reset_device_spare_id_in_operational(operational_sys_name, cursor):
     cursor.execute(UPDATE_DEVICE_SPARE_ID, data_update)
 
 def _get_system_properties(system_name, cursor):
-    Property = namedtuple('Property', 'id, name, value')
     system_properties = dict()
     
     data_get = {'system_name':system_name}
@@ -191,66 +547,187 @@ def _get_system_properties(system_name, cursor):
         system_properties[prop_name] = p
         
     return system_properties
+
+def _get_object_type(type_name, db_connection):
+    """Looks type_name up once per connection held through _db_connection: each lookup is a round trip."""
+    connection_types = _connection_types.get(id(db_connection))
+    if connection_types is None:
+        return db_connection.gettype(type_name)
+
+    if type_name not in connection_types:
+        connection_types[type_name] = db_connection.gettype(type_name)
+
+    return connection_types[type_name]
+
+def _new_names_collection(system_names, cursor):
+    """Returns the system names as a collection that can be bound to TABLE(:system_names)."""
+    names = _get_object_type('SYS.ODCIVARCHAR2LIST', cursor.connection).newobject()
+    names.extend(system_names)
+    return names
+
+def _iter_systems_properties(system_names, cursor):
+    """Yields (system name, properties) pairs for the given systems, one system at a time.
+
+    The names are bound as a collection, BULK_FETCH_MAX_NAMES per round trip, and the rows
+    are streamed in batches of BULK_FETCH_ARRAYSIZE. Only the properties of the system being
+    yielded are kept in memory. Systems without properties are not yielded. The cursor cannot
+    be used for anything else until the generator is exhausted.
+    """
+    names = sorted(set(system_names))
+    cursor.arraysize = BULK_FETCH_ARRAYSIZE
+
+    for start in range(0, len(names), BULK_FETCH_MAX_NAMES):
+        names_chunk = _new_names_collection(names[start:start + BULK_FETCH_MAX_NAMES], cursor)
+
+        rows = cursor.execute(GET_SYSTEMS_PROPERTIES, {'system_names': names_chunk})
+        yield from _group_systems_properties(rows)
+
+def _group_systems_properties(rows):
+    """Groups (system name, property name, property id, value) rows ordered by system name."""
+    for system_name, system_rows in itertools.groupby(rows, key=lambda row: row[0]):
+        system_properties = dict()
+        for _, prop_name, prop_id, prop_value in system_rows:
+            system_properties[prop_name] = Property(prop_id, str(prop_name), str(prop_value))
+
+        yield system_name, system_properties
+
+def _get_systems_properties(system_names, cursor):
+    """Returns a dictionary system name -> properties, with an entry for every requested system."""
+    systems_properties = {system_name: dict() for system_name in system_names}
+    systems_properties.update(_iter_systems_properties(system_names, cursor))
+    return systems_properties
+
+def get_systems_properties(system_names, db_instance: str):
+    """Yields (system name, properties) pairs for the given systems, fetched in bulk.
+
+    The connection is held until the generator is exhausted or closed, with no operation budget
+    (each round trip is still bounded by the call timeout). With a local replica
+    enabled, the properties are read from the replica instead; only the systems the replica
+    does not hold are fetched from Oracle.
+    """
+    local_replica = _get_fresh_replica(db_instance)
+    if local_replica is not None:
+        unknown_names = local_replica.get_unknown_systems(system_names)
+        yield from _group_systems_properties(local_replica.get_systems_property_rows(set(system_names) - unknown_names))
+
+        if not unknown_names:
+            return
+
+        system_names = unknown_names
+
+    # The consumer's time between rows counts too: like replication, only the round trips are bounded
+    with _db_connection(db_instance, operation_timeout=0) as db_connection:
+        with db_connection.cursor() as cursor:
+            yield from _iter_systems_properties(system_names, cursor)
     
-def _instantiate_system_properties(operational_sys_name, spare_sys_name, combo_sys_name, sys_id, cursor):
-    op_system_properties    = _get_system_properties(operational_sys_name, cursor)
-    spare_system_properties = _get_system_properties(spare_sys_name, cursor)
+def _get_property_source(prop_name):
+    """Returns the system a combo takes the property from, or None if the property is unknown."""
+    try:
+        fgc_property = properties.fgc_properties[prop_name]
+
+    except KeyError:
+        return None
+
+    return PROPERTY_SOURCE_SPARE if 'from_spare_converter' in fgc_property else PROPERTY_SOURCE_OPERATIONAL
+
+def _blend_system_properties(op_system_properties, spare_system_properties):
+    """Returns the combo system properties and the errors found while blending them."""
+    errors = list()
 
     op_properties    = sorted(op_system_properties.keys())
     spare_properties = sorted(spare_system_properties.keys())
-    try:
-        assert op_properties == spare_properties
-
-    except AssertionError as ae:
+    if op_properties != spare_properties:
         msg = 'ERROR: system properties for operational and spare systems are not the same!\n'
         msg += f'Operational: {op_properties};\n Spare: {spare_properties}\n'
         msg += f'Difference: {set(op_properties) ^ set(spare_properties)}'
-        raise AssertionError(msg) from ae
+        errors.append(msg)
 
     combo_system_properties = dict()
     for prop in op_system_properties.keys():
-        try:
-            properties.fgc_properties[prop]
+        source = _get_property_source(prop)
 
-        except KeyError:
-            print(f'ERROR: system property {prop} not found in properties.py autogenerated module! Make sure module and database are in sync')
+        if source is None:
+            errors.append(f'ERROR: system property {prop} not found in properties.py autogenerated module! Make sure module and database are in sync')
             continue
 
-        try:
-            properties.fgc_properties[prop]['from_spare_converter']
+        if source == PROPERTY_SOURCE_SPARE:
+            if prop in spare_system_properties:
+                combo_system_properties[prop] = spare_system_properties[prop]
 
-        except KeyError:
+        else:
             combo_system_properties[prop] = op_system_properties[prop]
 
+    return combo_system_properties, errors
+
+def _diff_system_properties(target_properties, current_properties):
+    """Returns the properties to insert, update and delete so that current_properties become target_properties."""
+    to_insert = [p for name, p in target_properties.items() if name not in current_properties]
+    to_update = [p for name, p in target_properties.items() if name in current_properties and current_properties[name] != p]
+    to_delete = [p for name, p in current_properties.items() if name not in target_properties]
+    return to_insert, to_update, to_delete
+
+def _diff_combo_properties(op_system_properties, spare_system_properties, combo_system_properties):
+    """Yields a PropertyDiff per property of any of the three systems, in property name order."""
+    prop_names = set(op_system_properties) | set(spare_system_properties) | set(combo_system_properties)
+
+    for prop_name in sorted(prop_names):
+        op_value    = op_system_properties[prop_name].value if prop_name in op_system_properties else None
+        spare_value = spare_system_properties[prop_name].value if prop_name in spare_system_properties else None
+        combo_value = combo_system_properties[prop_name].value if prop_name in combo_system_properties else None
+        source      = _get_property_source(prop_name)
+
+        if source == PROPERTY_SOURCE_SPARE:
+            expected_value = spare_value
+
+        elif source == PROPERTY_SOURCE_OPERATIONAL:
+            expected_value = op_value
+
         else:
-            combo_system_properties[prop] = spare_system_properties[prop]
+            expected_value = combo_value
 
-    data = list()
-    for _, p in combo_system_properties.items():
-        data.append((sys_id, p.id, p.value))
+        yield PropertyDiff(prop_name, op_value, spare_value, combo_value, source, combo_value == expected_value)
 
-    cursor.executemany(INSTANTIATE_SYSTEM_PROPERTIES, data)
-    
-def _link_spare_components_to_new_system(combo_sys_name, spare_sys_name, cursor):
-    cursor.execute(LINK_SPARE_COMPONENTS_TO_COMBO_SYSTEM, {'combo_sys_name':combo_sys_name, 'spare_sys_name':spare_sys_name})
+def get_combo_property_diff(operational: str, spare: str, db_instance: str) -> list:
+    """Returns the operational, spare and combo values of every property, fetched in one bulk query.
+
+    Database errors are raised as RuntimeError.
+    """
+    combo_system_name = _generate_combo_system_name(operational, spare)
+    system_names = [operational, spare, combo_system_name]
+
+    systems_properties = {system_name: dict() for system_name in system_names}
+    try:
+        systems_properties.update(get_systems_properties(system_names, db_instance))
+
+    except cx_Oracle.Error as oe:
+        raise RuntimeError(str(oe)) from oe
+
+    return list(_diff_combo_properties(systems_properties[operational],
+                                       systems_properties[spare],
+                                       systems_properties[combo_system_name]))
+
+def _get_system_components(system_name, cursor):
+    return {row[0] for row in cursor.execute(GET_SYSTEM_COMPONENTS, {'system_name': system_name})}
 
 def _insert_combo_system(spare, combo_system_name, cursor):
-    cursor.execute(INSERT_COMBO_SYSTEM, {'combo_sys_name': combo_system_name, 'class_id': pyfgc_name.devices[spare]['class_id'], 'spare_sys_name': spare})
+    cursor.execute(INSERT_COMBO_SYSTEM, {'combo_sys_name': combo_system_name, 'class_id': get_device_table().class_id(spare), 'spare_sys_name': spare})
     cursor.execute(GET_SPARE_SYS_ID, {'combo_sys_name': combo_system_name})
     new_sys_id = cursor.fetchone()[0]
     return new_sys_id
 
 def _generate_combo_system_name(operational, spare):
-    spare_id = '{:02d}'.format(pyfgc_name.devices[spare]['channel'])
+    spare_id = '{:02d}'.format(get_device_table().channel(spare))
     combo_system_name = operational + '_' + spare_id
     return combo_system_name
 
 def _get_combo_systems(db_instance: str):
-    secret = _get_db_crendentials(db_instance)
-    
     combo_systems = list()
-    
-    with cx_Oracle.connect(DB_USER, secret, _db_conn_strings[db_instance.lower()]) as db_connection:
+
+    local_replica = _get_fresh_replica(db_instance)
+    if local_replica is not None:
+        return local_replica.get_combo_systems()
+
+    with _db_connection(db_instance) as db_connection:
         with db_connection.cursor() as cursor:
             combo_systems = [system_name[0] for system_name in cursor.execute(GET_SPARE_SYSTEMS).fetchall()]
 
@@ -258,58 +735,84 @@ def _get_combo_systems(db_instance: str):
 
 def activate_configuration(combo_system_name, db_instance):
     operational_sys_name, spare_id = combo_system_name.split('_')
-    secret = _get_db_crendentials(db_instance)
-
-    with cx_Oracle.connect(DB_USER, secret, _db_conn_strings[db_instance.lower()]) as db_connection:
-        db_connection.autocommit = False
 
-        with db_connection.cursor() as cursor:
-            data_update = {'spare_id':spare_id, 'operational_sys_name':operational_sys_name, 'property_name':'DEVICE.SPARE_ID'}
-            cursor.execute(UPDATE_DEVICE_SPARE_ID, data_update)
+    def activate(cursor):
+        data_update = {'spare_id':spare_id, 'operational_sys_name':operational_sys_name, 'property_name':'DEVICE.SPARE_ID'}
+        cursor.execute(UPDATE_DEVICE_SPARE_ID, data_update)
 
-        db_connection.commit()
+    _run_locked(operational_sys_name, db_instance, activate)
 
 def deactivate_configuration(combo_system_name, db_instance):
     operational_sys_name = combo_system_name.split('_')[0]
-    secret = _get_db_crendentials(db_instance)
-
-    with cx_Oracle.connect(DB_USER, secret, _db_conn_strings[db_instance.lower()]) as db_connection:
-        db_connection.autocommit = False
 
-        with db_connection.cursor() as cursor:
-            _reset_device_spare_id_in_operational(operational_sys_name, cursor)
+    def deactivate(cursor):
+        _reset_device_spare_id_in_operational(operational_sys_name, cursor)
 
-        db_connection.commit()
+    _run_locked(operational_sys_name, db_instance, deactivate)
 
 def delete_combo_system(operational: str, spare: str, db_instance: str):
-    combo_sys_name = operational + '_' + '{:02d}'.format(pyfgc_name.devices[spare]['channel'])
-    secret = _get_db_crendentials(db_instance)
-    
-    with cx_Oracle.connect(DB_USER, secret, _db_conn_strings[db_instance.lower()]) as db_connection:
-        db_connection.autocommit = False
+    combo_sys_name = _generate_combo_system_name(operational, spare)
 
-        with db_connection.cursor() as cursor:
-            _delete_components_from_combo_system(combo_sys_name, cursor)
-            _delete_system_properties_from_combo_system(combo_sys_name, cursor)
-            _delete_combo_system(combo_sys_name, cursor)
-            _reset_device_spare_id_in_operational(operational, cursor)
+    def delete(cursor):
+        _delete_components_from_combo_system(combo_sys_name, cursor)
+        _delete_system_properties_from_combo_system(combo_sys_name, cursor)
+        _delete_combo_system(combo_sys_name, cursor)
+        _reset_device_spare_id_in_operational(operational, cursor)
 
-        db_connection.commit()
+    _run_locked(operational, db_instance, delete)
 
 def get_system_id(combo_system_name: str, db_instance:str) -> int:
-    secret = _get_db_crendentials(db_instance)
     system_id = None
 
-    with cx_Oracle.connect(DB_USER, secret, _db_conn_strings[db_instance.lower()]) as db_connection:
+    local_replica = _get_fresh_replica(db_instance)
+    if local_replica is not None:
+        return local_replica.get_system_id(combo_system_name)
+
+    with _db_connection(db_instance) as db_connection:
         with db_connection.cursor() as cursor:
             system_id = cursor.execute(GET_SYSTEM_ID, {'system_name':combo_system_name}).fetchone()[0]
 
     return system_id
 
+def get_spare_status(db_instance: str) -> list:
+    """Returns the status of every operational-spare combination, fetched in a single query.
+
+    Spare names are resolved from the name file; the spare is empty if no device of the
+    operational's gateway uses the combination's dongle. Database errors are raised as RuntimeError.
+    """
+    device_table = get_device_table()
+    spare_status = list()
+    # gateway -> {channel: device name}, built once per gateway met
+    gateway_channels = dict()
+
+    try:
+        with _db_connection(db_instance) as db_connection:
+            with db_connection.cursor() as cursor:
+                cursor.arraysize = BULK_FETCH_ARRAYSIZE
+
+                for operational, spare_id, combo_sys_id, active in cursor.execute(GET_SPARE_STATUS):
+                    try:
+                        gateway = device_table.gateway(operational)
+                        if gateway not in gateway_channels:
+                            gateway_channels[gateway] = {device_table.channel(name): name for name in reversed(device_table.filter(gateway=gateway))}
+
+                        spare = gateway_channels[gateway].get(int(spare_id))
+
+                    except (KeyError, ValueError, TypeError):
+                        spare = None
+
+                    spare_status.append(SpareStatus(operational, spare or '', combo_sys_id, bool(active)))
+
+    except cx_Oracle.Error as oe:
+        raise RuntimeError(str(oe)) from oe
+
+    return spare_status
+
 def get_spare_systems_from_operational(operational, db_instance):
     combo_systems = _get_combo_systems(db_instance)
-    combo_systems_dongles = [int(dev.split('_')[-1]) for dev in combo_systems]
-    spares = [spare for spare in pyfgc_name.gateways[operational.gateway]['devices'] if pyfgc_name.devices[spare]['channel'] in combo_systems_dongles]
+    combo_systems_dongles = {int(dev.split('_')[-1]) for dev in combo_systems}
+    device_table = get_device_table()
+    spares = [spare for spare in device_table.filter(gateway=operational.gateway) if device_table.channel(spare) in combo_systems_dongles]
     return spares
 
 def _get_arguments_from_cmd_line(operational=None, spare=None, database=None):
@@ -329,14 +832,13 @@ def run_security_checks(operational: str, spare: str, db_instance:str) -> None:
     if operational == spare:
         raise AssertionError(f'Operational and spare devices cannot be the same!')
 
-    op_class_id    = pyfgc_name.devices[operational]['class_id']
-    spare_class_id = pyfgc_name.devices[spare]['class_id']
-    if op_class_id != spare_class_id:
+    device_table = get_device_table()
+    op_device    = device_table.get(operational)
+    spare_device = device_table.get(spare)
+    if op_device.class_id != spare_device.class_id:
         raise AssertionError(f'FGCs {operational} and {spare} are of different classes!')
 
-    op_gw    = pyfgc_name.devices[operational]['gateway']
-    spare_gw = pyfgc_name.devices[spare]['gateway']
-    if op_gw != spare_gw:
+    if op_device.gateway != spare_device.gateway:
         raise AssertionError(f'FGCs {operational} and {spare} belong to different gateways!')
 
     try:
@@ -346,28 +848,235 @@ def run_security_checks(operational: str, spare: str, db_instance:str) -> None:
         possible_values = ', '.join([k for k in _db_conn_strings.keys()])
         raise KeyError(f'Database instance {db_instance} not valid! Possible values: {possible_values}') from ke
 
+class OperationPlan:
+    """Every row a combo operation would write, computed without writing anything.
+
+    Property rows are Property tuples of the combo system; component links are component ids.
+    A plan can only be executed if it has no errors.
+    """
+    def __init__(self, operation, operational, spare, combo_system_name, db_instance):
+        self.operation           = operation
+        self.operational         = operational
+        self.spare               = spare
+        self.combo_system_name   = combo_system_name
+        self.db_instance         = db_instance
+        self.combo_sys_id        = None
+        self.insert_combo_system = False
+        self.reset_spare_id      = False
+        self.property_inserts    = list()
+        self.property_updates    = list()
+        self.property_deletes    = list()
+        self.link_inserts        = list()
+        self.link_deletes        = list()
+        self.errors              = list()
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+    @property
+    def row_count(self):
+        return (int(self.insert_combo_system) + int(self.reset_spare_id) +
+                len(self.property_inserts) + len(self.property_updates) + len(self.property_deletes) +
+                len(self.link_inserts) + len(self.link_deletes))
+
+    @property
+    def statement_count(self):
+        # One round trip per single statement or array DML
+        count = int(self.reset_spare_id) + 2 * int(self.insert_combo_system)
+        count += sum(1 for rows in (self.link_inserts, self.link_deletes, self.property_deletes) if rows)
+
+        # New property rows and updated ones go in the same array MERGE, or array INSERT for a new combo
+        if self.property_inserts or self.property_updates:
+            count += 1
+
+        return count
+
+    def summary(self):
+        lines = [f'Plan to {self.operation} the configuration of {self.operational} with spare {self.spare} in {self.db_instance.upper()} database:']
+
+        if self.reset_spare_id:
+            lines.append(f'    reset DEVICE.SPARE_ID of {self.operational}')
+
+        if self.insert_combo_system:
+            lines.append(f'    insert combo system {self.combo_system_name}')
+
+        lines.append(f'    properties: {len(self.property_inserts)} to insert, {len(self.property_updates)} to update, {len(self.property_deletes)} to delete')
+        lines.append(f'    component links: {len(self.link_inserts)} to insert, {len(self.link_deletes)} to delete')
+        lines.append(f'    {self.row_count} rows in {self.statement_count} statements')
+        lines.extend(f'    {error}' for error in self.errors)
+
+        return '\n'.join(lines)
+
+def _plan_combo_system(plan, cursor):
+    systems_properties = _get_systems_properties([plan.operational, plan.spare, plan.combo_system_name], cursor)
+    op_system_properties    = systems_properties[plan.operational]
+    spare_system_properties = systems_properties[plan.spare]
+    combo_system_properties = systems_properties[plan.combo_system_name]
+
+    # The reset is written before the combo properties: the combo inherits the reset value
+    if plan.reset_spare_id and 'DEVICE.SPARE_ID' in op_system_properties:
+        op_system_properties['DEVICE.SPARE_ID'] = op_system_properties['DEVICE.SPARE_ID']._replace(value='0')
+
+    for system_name in (plan.operational, plan.spare):
+        if not systems_properties[system_name]:
+            plan.errors.append(f'ERROR: system {system_name} has no system properties!')
+
+    target_properties, errors = _blend_system_properties(op_system_properties, spare_system_properties)
+    plan.errors.extend(errors)
+
+    plan.property_inserts, plan.property_updates, plan.property_deletes = _diff_system_properties(target_properties, combo_system_properties)
+
+    spare_components = _get_system_components(plan.spare, cursor)
+    combo_components = _get_system_components(plan.combo_system_name, cursor) if plan.combo_sys_id else set()
+    plan.link_inserts = sorted(spare_components - combo_components)
+    plan.link_deletes = sorted(combo_components - spare_components)
+
+def _new_plan(operation, operational, spare, db_instance):
+    plan = OperationPlan(operation, operational, spare, None, db_instance)
+
+    try:
+        run_security_checks(operational, spare, db_instance)
+        plan.combo_system_name = _generate_combo_system_name(operational, spare)
+
+    except (AssertionError, KeyError) as e:
+        plan.errors.append(f'ERROR: {e}')
+
+    return plan
+
+def plan_op_spare_combo_system(operational: str, spare: str, db_instance: str) -> OperationPlan:
+    """Returns the plan to create the combo system of operational and spare, without writing.
+
+    Database errors are raised as RuntimeError.
+    """
+    plan = _new_plan('create', operational, spare, db_instance)
+    if not plan.is_valid:
+        return plan
+
+    try:
+        with _db_connection(db_instance) as db_connection:
+            with db_connection.cursor() as cursor:
+                if cursor.execute(GET_SYSTEM_ID, {'system_name': plan.combo_system_name}).fetchone() is not None:
+                    plan.errors.append(f'ERROR: operational-spare configuration {plan.combo_system_name} already exists!')
+
+                plan.insert_combo_system = True
+                plan.reset_spare_id = True
+                _plan_combo_system(plan, cursor)
+
+    except cx_Oracle.Error as oe:
+        raise RuntimeError(str(oe)) from oe
+
+    return plan
+
+def plan_resync_combo_system(operational: str, spare: str, db_instance: str) -> OperationPlan:
+    """Returns the plan to resync an existing combo system, without writing.
+
+    Only the property rows and component links that differ are planned; the operational's
+    DEVICE.SPARE_ID is left untouched. Database errors are raised as RuntimeError.
+    """
+    plan = _new_plan('resync', operational, spare, db_instance)
+    if not plan.is_valid:
+        return plan
+
+    try:
+        with _db_connection(db_instance) as db_connection:
+            with db_connection.cursor() as cursor:
+                sys_id = cursor.execute(GET_SYSTEM_ID, {'system_name': plan.combo_system_name}).fetchone()
+                if sys_id is None:
+                    plan.errors.append(f'ERROR: operational-spare configuration {plan.combo_system_name} does not exist!')
+                    return plan
+
+                plan.combo_sys_id = sys_id[0]
+                _plan_combo_system(plan, cursor)
+
+    except cx_Oracle.Error as oe:
+        raise RuntimeError(str(oe)) from oe
+
+    return plan
+
+def _get_plan_rows(plan):
+    # Compared as sets: the order of the property rows within a system is not guaranteed
+    rows = (plan.property_inserts, plan.property_updates, plan.property_deletes, plan.link_inserts, plan.link_deletes)
+    return tuple(frozenset(plan_rows) for plan_rows in rows)
+
+def execute_plan(plan: OperationPlan) -> int:
+    """Applies a validated plan in a single transaction, holding the operational's lock.
+
+    Under the lock, the plan is computed again from the current data. If the combo system, or
+    the rows to write, changed since planning, AssertionError is raised and nothing is written.
+    Returns the combo system id.
+    """
+    if not plan.is_valid:
+        raise AssertionError('\n'.join(plan.errors))
+
+    def execute(cursor):
+        sys_id = cursor.execute(GET_SYSTEM_ID, {'system_name': plan.combo_system_name}).fetchone()
+        if plan.insert_combo_system and sys_id is not None:
+            raise AssertionError(f'Operational-spare configuration {plan.combo_system_name} was created by another operator!')
+
+        if not plan.insert_combo_system and (sys_id is None or sys_id[0] != plan.combo_sys_id):
+            raise AssertionError(f'Operational-spare configuration {plan.combo_system_name} was deleted or recreated by another operator!')
+
+        # The plan was computed outside the lock: it is only applied if it still holds
+        current_plan = OperationPlan(plan.operation, plan.operational, plan.spare, plan.combo_system_name, plan.db_instance)
+        current_plan.combo_sys_id = plan.combo_sys_id
+        _plan_combo_system(current_plan, cursor)
+        if current_plan.errors or _get_plan_rows(current_plan) != _get_plan_rows(plan):
+            raise AssertionError(f'Operational-spare configuration {plan.combo_system_name} was changed by another operator, plan it again!')
+
+        if plan.reset_spare_id:
+            _reset_device_spare_id_in_operational(plan.operational, cursor)
+
+        if plan.insert_combo_system:
+            plan.combo_sys_id = _insert_combo_system(plan.spare, plan.combo_system_name, cursor)
+
+        sys_id = plan.combo_sys_id
+
+        if plan.link_inserts:
+            cursor.executemany(LINK_COMPONENT_TO_SYSTEM, [(sys_id, cmp_id) for cmp_id in plan.link_inserts])
+
+        if plan.link_deletes:
+            cursor.executemany(UNLINK_COMPONENT_FROM_SYSTEM, [(sys_id, cmp_id) for cmp_id in plan.link_deletes])
+
+        if plan.insert_combo_system:
+            cursor.executemany(INSTANTIATE_SYSTEM_PROPERTIES, [(sys_id, p.id, p.value) for p in plan.property_inserts])
+
+        elif plan.property_inserts or plan.property_updates:
+            cursor.executemany(MERGE_SYSTEM_PROPERTY, [(sys_id, p.id, p.value) for p in plan.property_inserts + plan.property_updates])
+
+        if plan.property_deletes:
+            cursor.executemany(DELETE_SYSTEM_PROPERTY, [(sys_id, p.id) for p in plan.property_deletes])
+
+        return sys_id
+
+    return _run_locked(plan.operational, plan.db_instance, execute)
+
 def create_op_spare_combo_system(operational: str, spare: str, db_instance: str) -> int:
-    new_sys_id = None
+    run_security_checks(operational, spare, db_instance)
+    plan = plan_op_spare_combo_system(operational, spare, db_instance)
+    return execute_plan(plan)
+
+def resync_combo_system(operational: str, spare: str, db_instance: str) -> int:
+    """Brings an existing combo system in line with its operational and spare systems.
 
+    Returns the number of rows written.
+    """
     run_security_checks(operational, spare, db_instance)
-    secret = _get_db_crendentials(db_instance)
-    combo_system_name = _generate_combo_system_name(operational, spare)
+    plan = plan_resync_combo_system(operational, spare, db_instance)
+    execute_plan(plan)
+    return plan.row_count
 
-    with cx_Oracle.connect(DB_USER, secret, _db_conn_strings[db_instance.lower()]) as db_connection:
-        db_connection.autocommit = False
+def print_plan(operational: str, spare: str, db_instance: str, action=create_op_spare_combo_system) -> None:
+    planners = {create_op_spare_combo_system: plan_op_spare_combo_system, resync_combo_system: plan_resync_combo_system}
 
-        with db_connection.cursor() as cursor:
-            try:
-                _reset_device_spare_id_in_operational(operational, cursor)
-                new_sys_id = _insert_combo_system(spare, combo_system_name, cursor)
-                _link_spare_components_to_new_system(combo_system_name, spare, cursor)
-                _instantiate_system_properties(operational, spare, combo_system_name, new_sys_id, cursor)
-                db_connection.commit()
+    try:
+        planner = planners[action]
 
-            except cx_Oracle.Error as oe:
-                raise RuntimeError(str(oe))
+    except KeyError:
+        print('Dry run is only available for creating or resyncing an op-spare configuration')
+        sys.exit(2)
 
-    return new_sys_id
+    print(planner(operational, spare, db_instance).summary())
 
 def configure_parser(parser: 'argparser.ArgumentParser') -> None:
     parser.description = __doc__
@@ -381,10 +1090,25 @@ def configure_parser(parser: 'argparser.ArgumentParser') -> None:
                         const=delete_combo_system,
                         default=create_op_spare_combo_system,
                         help='DELETE op-spare configuration (default: create op-spare configuration)')
+    parser.add_argument('--resync',
+                        dest='action',
+                        action='store_const',
+                        const=resync_combo_system,
+                        help='RESYNC existing op-spare configuration with the current operational and spare configurations')
+    parser.add_argument('--dry-run',
+                        dest='dry_run',
+                        action='store_true',
+                        help='Print what the create or resync operation would write, without writing anything')
 
 if __name__ == '__main__':
     pyfgc_name.read_name_file()
     parser = argparse.ArgumentParser()
     configure_parser(parser)
     args = parser.parse_args().__dict__.copy()
-    args.pop('action')(*_get_arguments_from_cmd_line(**args))
+    action = args.pop('action')
+
+    if args.pop('dry_run'):
+        print_plan(*_get_arguments_from_cmd_line(**args), action=action)
+
+    else:
+        action(*_get_arguments_from_cmd_line(**args))
@@ -9,6 +9,7 @@ from PyQt5           import uic
 from PyQt5.QtWidgets import QMainWindow, QWidget
 from PyQt5.QtWidgets import QHBoxLayout, QVBoxLayout
 from PyQt5.QtWidgets import (QComboBox,
+                            QCompleter,
                             QGroupBox,
                             QLabel,
                             QLineEdit,
@@ -19,6 +20,8 @@ from PyQt5.QtWidgets import (QComboBox,
                             QScrollArea)
 
 from spare_manager import config_blender as blender
+from spare_manager import profiling
+from spare_manager import spare_allocator
 from spare_manager.model import SpareModel
 
 DB_INSTANCE = 'pro'
@@ -50,9 +53,11 @@ class SpareManagerWindow(QMainWindow):
         self._op_device = None
         self._spare_device = None
         self._generate_config_logger = None
-        self._model = SpareModel()
+        with profiling.stage('Build device model'):
+            self._model = SpareModel()
 
-        self.ui = uic.loadUi(Path(__file__).parent / 'create_config_view.ui', self)
+        with profiling.stage('Load UI'):
+            self.ui = uic.loadUi(Path(__file__).parent / 'create_config_view.ui', self)
 
         self._set_signals_slots()
 
@@ -65,7 +70,7 @@ class SpareManagerWindow(QMainWindow):
         # Generate Config tab
         self.ui.selectopdevicePushButton.clicked.connect(lambda: self._load_device(self.ui.operationalLineEdit.text(), 'operational'))
         self.ui.selectsparedevicePushButton.clicked.connect(lambda: self._load_device(self.ui.spareLineEdit.text(), 'spare'))
-        self.ui.generatePushButton.clicked.connect(self._generate_config)
+        self.ui.generatePushButton.clicked.connect(lambda: self._generate_config())
 
         self._create_activity_box()
 
@@ -76,6 +81,10 @@ class SpareManagerWindow(QMainWindow):
         logging.getLogger().addHandler(self._generate_config_logger)
         logging.getLogger().setLevel(logging.INFO)
 
+        # Timings recorded before the activity box existed, e.g. the name file parsing
+        profiling.flush()
+
+    @profiling.timed('Load device')
     def _load_device(self, device, device_role):
         device_upper = device.upper()
 
@@ -89,11 +98,40 @@ class SpareManagerWindow(QMainWindow):
             if device_role == 'operational':
                 self._op_device = DeviceData(device_upper, class_id, gw, dongle)
                 logging.info(f'FGC {device_upper} loaded as OPERATIONAL')
+                self._suggest_spares(device_upper)
 
             elif device_role == 'spare':
                 self._spare_device = DeviceData(device_upper, class_id, gw, dongle)
                 logging.info(f'FGC {device_upper} loaded as SPARE')
 
+    def _suggest_spares(self, operational):
+        try:
+            candidates = spare_allocator.recommend_spares(operational, DB_INSTANCE)
+
+        except (FileNotFoundError, RuntimeError) as e:
+            logging.info(f'Could not look up the spare FGCs compatible with {operational}! {e}')
+            return
+
+        if not candidates:
+            logging.info(f'No spare FGC compatible with {operational} found')
+            return
+
+        self.ui.spareLineEdit.setCompleter(QCompleter([c.name for c in candidates], self))
+
+        lines = [f'Compatible spare FGCs for {operational}:']
+        for c in candidates:
+            combo_status = 'combo exists' if c.combo_exists else 'no combo yet'
+            use_status = f'in use by {c.in_use_by}' if c.in_use_by else 'free'
+            lines.append(f'    {c.name} (dongle {c.channel:02d}): {use_status}, {combo_status}')
+
+        logging.info('\n'.join(lines))
+
+        # Never overwrite a spare typed in by the operator
+        if not self.ui.spareLineEdit.text():
+            self.ui.spareLineEdit.setText(candidates[0].name)
+            self._load_device(candidates[0].name, 'spare')
+
+    @profiling.timed('Generate configuration')
     def _generate_config(self):
         logging.info('Generating operational-spare configuration...')
 
@@ -104,7 +142,9 @@ class SpareManagerWindow(QMainWindow):
             if self._spare_device is None:
                 raise AssertionError(f'Spare device has not been selected')
 
-            system_id = blender.create_op_spare_combo_system(self._op_device.name, self._spare_device.name, DB_INSTANCE)
+            plan = blender.plan_op_spare_combo_system(self._op_device.name, self._spare_device.name, DB_INSTANCE)
+            logging.info(plan.summary())
+            system_id = blender.execute_plan(plan)
         
         except (AssertionError, FileNotFoundError, RuntimeError) as e:
             self._show_error_popup_window(str(e))
@@ -0,0 +1,144 @@
+"""Compact, column-oriented view of the FGC devices in the name file.
+
+pyfgc_name.devices holds one dictionary per device. The DeviceTable keeps the same information
+in parallel columns: interned device names, and the class id, gateway index and channel of
+each device in typed arrays. It is an index built on top of the name file, which pyfgc_name
+keeps loaded, not a replacement for it. A dictionary maps every name to its row and each
+gateway has the list of its rows, so lookups within a gateway only visit that gateway's
+devices. Filtering by class or channel scans a single array rather than every device dictionary.
+"""
+import itertools
+import sys
+import threading
+from array import array
+from collections import namedtuple
+
+import pyfgc_name
+
+SPARE_MANAGED_CLASS_ID = 63
+
+DeviceRow = namedtuple('DeviceRow', 'name, class_id, gateway, channel')
+
+class DeviceTable:
+    def __init__(self, devices):
+        self.names     = list()
+        self.gateways  = list()
+        self.class_ids = array('H')
+        self.gateway_indexes = array('I')
+        self.channels  = array('H')
+
+        self._row_by_name = dict()
+        self._gateway_index_by_name = dict()
+        self._rows_by_gateway = list()
+
+        for name, dev_obj in sorted(devices.items()):
+            gateway_index = self._intern_gateway(dev_obj['gateway'])
+
+            self._rows_by_gateway[gateway_index].append(len(self.names))
+            self._row_by_name[sys.intern(name)] = len(self.names)
+            self.names.append(sys.intern(name))
+            self.class_ids.append(dev_obj['class_id'])
+            self.gateway_indexes.append(gateway_index)
+            self.channels.append(dev_obj['channel'])
+
+    def _intern_gateway(self, gateway):
+        try:
+            return self._gateway_index_by_name[gateway]
+
+        except KeyError:
+            gateway_index = len(self.gateways)
+            self.gateways.append(sys.intern(gateway))
+            self._gateway_index_by_name[gateway] = gateway_index
+            self._rows_by_gateway.append(list())
+            return gateway_index
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._row_by_name
+
+    def row(self, name) -> int:
+        """Returns the row of device name. Raises KeyError if the device does not exist."""
+        return self._row_by_name[name]
+
+    def get(self, name) -> DeviceRow:
+        row = self._row_by_name[name]
+        return DeviceRow(self.names[row],
+                         self.class_ids[row],
+                         self.gateways[self.gateway_indexes[row]],
+                         self.channels[row])
+
+    def class_id(self, name) -> int:
+        return self.class_ids[self._row_by_name[name]]
+
+    def gateway(self, name) -> str:
+        return self.gateways[self.gateway_indexes[self._row_by_name[name]]]
+
+    def channel(self, name) -> int:
+        return self.channels[self._row_by_name[name]]
+
+    def filter(self, class_id=None, gateway=None, channel=None) -> list:
+        """Returns the names of the devices matching all the given criteria, in name order."""
+        if gateway is not None:
+            return [self.names[row] for row in self._get_gateway_rows(gateway)
+                    if (class_id is None or self.class_ids[row] == class_id) and (channel is None or self.channels[row] == channel)]
+
+        selectors = list()
+
+        if class_id is not None:
+            selectors.append(c == class_id for c in self.class_ids)
+
+        if channel is not None:
+            selectors.append(c == channel for c in self.channels)
+
+        if not selectors:
+            return list(self.names)
+
+        return list(itertools.compress(self.names, map(all, zip(*selectors))))
+
+    def _get_gateway_rows(self, gateway):
+        try:
+            return self._rows_by_gateway[self._gateway_index_by_name[gateway]]
+
+        except KeyError:
+            return list()
+
+    def find_in_gateway(self, gateway, channel):
+        """Returns the name of the device on the given gateway channel, or None."""
+        for row in self._get_gateway_rows(gateway):
+            if self.channels[row] == channel:
+                return self.names[row]
+
+        return None
+
+_device_table = None
+_device_table_lock = threading.Lock()
+
+def get_device_table() -> DeviceTable:
+    """Returns the device table built from the name file already read by pyfgc_name.
+
+    The table is built once per process. It is not cached while the name file has not been
+    read, so that an early call does not leave an empty table behind.
+    """
+    global _device_table
+
+    with _device_table_lock:
+        if _device_table is None:
+            device_table = DeviceTable(pyfgc_name.devices)
+            if not device_table:
+                return device_table
+
+            _device_table = device_table
+
+        return _device_table
+
+def reload_device_table() -> DeviceTable:
+    global _device_table
+
+    with _device_table_lock:
+        _device_table = None
+
+    return get_device_table()
+
+# EOF
@@ -1,18 +1,23 @@
 import re
-from PyQt5 import QtCore
+from PyQt5 import QtCore, QtGui
 
 import pyfgc_name
 
-try:
-    pyfgc_name.read_name_file(filename='/Users/cghabrou/Code/cern/name')
+from spare_manager import profiling
+from spare_manager.device_table import SPARE_MANAGED_CLASS_ID, get_device_table
 
-except FileNotFoundError:
-    pyfgc_name.read_name_file()
+with profiling.stage('Parse name file'):
+    try:
+        pyfgc_name.read_name_file(filename='/Users/cghabrou/Code/cern/name')
+
+    except FileNotFoundError:
+        pyfgc_name.read_name_file()
 
 class SpareModel(QtCore.QAbstractListModel):
     def __init__(self, *args, devices=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.default_devices = [dev for dev, dev_obj in pyfgc_name.devices.items() if dev_obj['class_id'] == 63]
+        self._device_table = get_device_table()
+        self.default_devices = self._device_table.filter(class_id=SPARE_MANAGED_CLASS_ID)
         self.devices = devices if devices else self.default_devices
         self.devices.sort()
 
@@ -44,21 +49,148 @@ class SpareModel(QtCore.QAbstractListModel):
         self.devices = filtered_devices
 
     def getDeviceData(self, device_name):
-        dev_obj = pyfgc_name.devices[device_name]
-        return dev_obj['class_id'], dev_obj['gateway'], dev_obj['channel']
+        dev_row = self._device_table.get(device_name)
+        return dev_row.class_id, dev_row.gateway, dev_row.channel
 
     def getOpAndSpareFromCombo(self, combo_name):
         operational, spare_id = combo_name.split('_')
         spare_dongle = int(spare_id)
-        fgcs_same_gw = pyfgc_name.gateways[pyfgc_name.devices[operational]['gateway']]['devices']
+        spare = self._device_table.find_in_gateway(self._device_table.gateway(operational), spare_dongle)
+
+        return operational, spare or ''
+
+
+class RowTableModel(QtCore.QAbstractTableModel):
+    """Table model over rows already in memory; cells are only built when the view asks for them.
+
+    Every row is exposed at once, so that a sort/filter proxy on top sees all of them. Models
+    shown without a proxy can hand their rows over in batches instead (see PropertyDiffModel).
+    """
+    HEADERS = tuple()
+
+    def __init__(self, *args, rows=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rows = list(rows) if rows else list()
+
+    def setRows(self, rows):
+        self.beginResetModel()
+        self._rows = list(rows)
+        self.endResetModel()
+
+    def rowData(self, row):
+        return self._rows[row]
+
+    def rowCount(self, index=QtCore.QModelIndex()):
+        return 0 if index.isValid() else len(self._rows)
+
+    def columnCount(self, index=QtCore.QModelIndex()):
+        return 0 if index.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+
+        return super().headerData(section, orientation, role)
+
+class SpareStatusModel(RowTableModel):
+    HEADERS = ('Operational', 'Spare', 'Combo system id', 'Active')
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if index.isValid() is False or index.row() >= len(self._rows):
+            return QtCore.QVariant()
+
+        status = self._rows[index.row()]
+
+        if role == QtCore.Qt.DisplayRole:
+            return (status.operational, status.spare, status.combo_sys_id, 'YES' if status.active else 'no')[index.column()]
+
+        if role == QtCore.Qt.BackgroundRole and status.active:
+            return QtGui.QBrush(QtGui.QColor('#c8f0c8'))
+
+        return QtCore.QVariant()
+
+class PropertyDiffModel(RowTableModel):
+    """Operational, spare and combo values of each property of a combo system.
+
+    The operational or spare cell the combo value is taken from is highlighted. Combo values
+    that do not match their source are shown in red.
+    """
+    HEADERS = ('Property', 'Operational', 'Spare', 'Combo')
+    SOURCE_COLOR   = '#c8e0f8'
+    MISMATCH_COLOR = '#f8c8c8'
+    FETCH_BATCH_SIZE = 200
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loaded_rows = 0
+
+    def setRows(self, rows):
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._loaded_rows = 0
+        self.endResetModel()
+
+    # The view shows the model directly, with no sort/filter proxy: rows can be handed over
+    # in batches, as the view scrolls
+    def rowCount(self, index=QtCore.QModelIndex()):
+        return 0 if index.isValid() else self._loaded_rows
+
+    def canFetchMore(self, index):
+        return not index.isValid() and self._loaded_rows < len(self._rows)
+
+    def fetchMore(self, index):
+        if index.isValid():
+            return
+
+        batch_size = min(self.FETCH_BATCH_SIZE, len(self._rows) - self._loaded_rows)
+        if batch_size <= 0:
+            return
+
+        self.beginInsertRows(QtCore.QModelIndex(), self._loaded_rows, self._loaded_rows + batch_size - 1)
+        self._loaded_rows += batch_size
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if index.isValid() is False or index.row() >= self._loaded_rows:
+            return QtCore.QVariant()
+
+        prop_diff = self._rows[index.row()]
+        column = index.column()
+
+        if role == QtCore.Qt.DisplayRole:
+            value = (prop_diff.name, prop_diff.operational, prop_diff.spare, prop_diff.combo)[column]
+            return '' if value is None else value
+
+        if role == QtCore.Qt.BackgroundRole:
+            if column == 3 and not prop_diff.matches:
+                return QtGui.QBrush(QtGui.QColor(self.MISMATCH_COLOR))
+
+            if (column == 1 and prop_diff.source == 'operational') or (column == 2 and prop_diff.source == 'spare'):
+                return QtGui.QBrush(QtGui.QColor(self.SOURCE_COLOR))
+
+        if role == QtCore.Qt.ToolTipRole and column == 3:
+            if prop_diff.source is None:
+                return 'Property unknown to the properties module'
+
+            return f'Taken from the {prop_diff.source} FGC' + ('' if prop_diff.matches else ' - VALUES DIFFER')
+
+        return QtCore.QVariant()
+
+class SpareStatusFilterModel(QtCore.QSortFilterProxyModel):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._active_only = False
+        self.setFilterKeyColumn(-1)
+        self.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+
+    def setActiveOnly(self, active_only):
+        self._active_only = bool(active_only)
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self._active_only and not self.sourceModel().rowData(source_row).active:
+            return False
+
+        return super().filterAcceptsRow(source_row, source_parent)
 
-        for fgc in fgcs_same_gw:
-            dongle_id = pyfgc_name.devices[fgc]['channel']
-        
-            if int(dongle_id) == spare_dongle:
-                return operational, fgc
-        
-        else:
-            return operational, ''
-                
 # EOF
@@ -0,0 +1,146 @@
+"""Stage-level timing of the spare manager start-up and GUI actions.
+
+Profiling is off by default. It is switched on by the sm_main -p/-P flags or by the
+SPARE_MANAGER_PROFILE environment variable:
+    1 (or any value but 'cprofile'): phase timing only
+    cprofile: phase timing plus a cProfile capture of the whole session
+
+Every time an outermost stage finishes, its timeline (the stage and the stages nested in it)
+is logged, which makes it show up in the activity box of the windows. Timelines finished while
+INFO messages are not logged yet (e.g. the name file parsed at import) are kept until flush() is
+called once the activity box exists. The cProfile capture is written when the session ends to
+SPARE_MANAGER_PROFILE_DIR (default: the temporary directory).
+"""
+import atexit
+import cProfile
+import functools
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+PROFILE_ENV_VAR = 'SPARE_MANAGER_PROFILE'
+PROFILE_DIR_ENV_VAR = 'SPARE_MANAGER_PROFILE_DIR'
+
+# Only the most recent stages and unlogged timelines are kept: a session can run for days
+MAX_STAGES = 1000
+MAX_UNLOGGED_TIMELINES = 50
+
+Stage = namedtuple('Stage', 'name, depth, start, duration')
+
+class SessionProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.stages = deque(maxlen=MAX_STAGES)
+        self._unlogged_timelines = deque(maxlen=MAX_UNLOGGED_TIMELINES)
+        # Nesting depth and unlogged stages of each thread: stages are also opened from worker threads
+        self._thread_state = threading.local()
+        self._cprofile = None
+        self._session_start = time.perf_counter()
+
+    def enable(self, capture=False, output_dir=None):
+        self.enabled = True
+
+        if capture and self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+            atexit.register(self.dump, output_dir)
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        thread_state = self._get_thread_state()
+        depth = thread_state.depth
+        thread_state.depth += 1
+        start = time.perf_counter()
+
+        try:
+            yield
+
+        finally:
+            thread_state.depth -= 1
+            stage = Stage(name, depth, start - self._session_start, time.perf_counter() - start)
+            self.stages.append(stage)
+            thread_state.pending.append(stage)
+
+            if depth == 0:
+                self._unlogged_timelines.append(self._format_timeline(thread_state.pending))
+                thread_state.pending = list()
+
+                if logging.getLogger().isEnabledFor(logging.INFO):
+                    self.flush()
+
+    def flush(self):
+        while self._unlogged_timelines:
+            logging.info(self._unlogged_timelines.popleft())
+
+    def _get_thread_state(self):
+        thread_state = self._thread_state
+        if not hasattr(thread_state, 'depth'):
+            thread_state.depth = 0
+            thread_state.pending = list()
+
+        return thread_state
+
+    def timed(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def summary(self):
+        return self._format_timeline(self.stages)
+
+    def dump(self, output_dir=None):
+        if self._cprofile is None:
+            return None
+
+        self._cprofile.disable()
+        output_dir = Path(output_dir or os.environ.get(PROFILE_DIR_ENV_VAR, tempfile.gettempdir()))
+        output_file = output_dir / 'spare_manager_{}_{}.prof'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid())
+        self._cprofile.dump_stats(str(output_file))
+        self._cprofile = None
+        print(f'Profile of the session written to {output_file}')
+
+        return output_file
+
+    @staticmethod
+    def _format_timeline(stages):
+        # Stages are recorded when they finish; sort them back to start order
+        lines = ['Timeline:']
+        for stage in sorted(stages, key=lambda s: s.start):
+            lines.append('{:>9.3f} s {}{:<{width}} {:>9.1f} ms'.format(
+                stage.start, '  ' * stage.depth, stage.name, stage.duration * 1e3, width=40 - 2 * stage.depth))
+
+        return '\n'.join(lines)
+
+_profiler = SessionProfiler()
+
+enable = _profiler.enable
+stage  = _profiler.stage
+timed  = _profiler.timed
+flush  = _profiler.flush
+
+def summary() -> str:
+    return _profiler.summary()
+
+def enable_from_environment() -> None:
+    profile_mode = os.environ.get(PROFILE_ENV_VAR, '')
+    if profile_mode and profile_mode != '0':
+        enable(capture=profile_mode.lower() == 'cprofile')
+
+enable_from_environment()
+
+# EOF
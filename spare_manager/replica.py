@@ -0,0 +1,455 @@
+"""Local, read-only SQLite replica of the spare related configuration tables.
+
+The replica holds the slices of FGC_SYSTEMS, FGC_SYSTEM_PROPERTIES and FGC_COMPONENT_SYSTEMS
+that concern the spare manager: the systems of the spare managed class and the combo systems,
+with their properties and component links. It is indexed for the lookups config_blender
+runs while browsing (combo lists, system ids, system properties), which are then served
+locally. Writes always go to Oracle.
+
+The replica is off by default. It is switched on for every database instance by pointing the
+SPARE_MANAGER_REPLICA_DIR environment variable to a directory, or per instance with enable().
+
+Refreshes are incremental. New and changed systems, property rows and component links are
+those with an ORA_ROWSCN above the watermark of the previous refresh. Deletions do not show
+up that way. The systems written by this process (see invalidate()) are fetched again as a
+whole. Deletions made elsewhere are found by a reconciliation that compares keys (systems,
+component links) and per-system row counts (properties) with the local copy. That scans the
+whole slice, so it only runs every REPLICA_RECONCILE_SECONDS.
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from spare_manager.device_table import SPARE_MANAGED_CLASS_ID
+
+REPLICA_DIR_ENV_VAR = 'SPARE_MANAGER_REPLICA_DIR'
+REPLICA_MAX_AGE_SECONDS = 60
+REPLICA_RECONCILE_SECONDS = 900
+REPLICA_FETCH_ARRAYSIZE = 5000
+# Below the default SQLITE_MAX_VARIABLE_NUMBER of older SQLite versions
+REPLICA_MAX_NAMES = 500
+
+REPLICA_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS systems (
+  sys_id        INTEGER PRIMARY KEY,
+  sys_name      TEXT NOT NULL,
+  is_combo      INTEGER NOT NULL,
+  ora_rowscn    INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS systems_name_idx ON systems (sys_name);
+CREATE INDEX IF NOT EXISTS systems_combo_idx ON systems (is_combo, sys_name);
+
+CREATE TABLE IF NOT EXISTS system_properties (
+  sys_id        INTEGER NOT NULL,
+  pro_id        INTEGER NOT NULL,
+  pro_name      TEXT NOT NULL,
+  value         TEXT,
+  ora_rowscn    INTEGER NOT NULL,
+  PRIMARY KEY (sys_id, pro_id)
+);
+
+CREATE TABLE IF NOT EXISTS component_systems (
+  sys_id        INTEGER NOT NULL,
+  cmp_id        INTEGER NOT NULL,
+  PRIMARY KEY (sys_id, cmp_id)
+);
+
+CREATE TABLE IF NOT EXISTS watermarks (
+  table_name    TEXT PRIMARY KEY,
+  ora_rowscn    INTEGER NOT NULL
+);
+'''
+
+SPARE_SYSTEMS_SLICE = '''
+  (fs.SYS_CLASS_ID = :class_id OR fs.SYS_IS_SPARE_COMBINATION = 1)
+'''
+
+GET_CHANGED_SYSTEMS = f'''
+SELECT
+  fs.SYS_ID,
+  fs.SYS_NAME,
+  fs.SYS_IS_SPARE_COMBINATION,
+  fs.ORA_ROWSCN
+FROM
+  FGC_SYSTEMS fs
+WHERE
+  {SPARE_SYSTEMS_SLICE} AND
+  fs.ORA_ROWSCN > :watermark
+'''
+
+GET_SYSTEM_KEYS = f'''
+SELECT
+  fs.SYS_ID
+FROM
+  FGC_SYSTEMS fs
+WHERE
+  {SPARE_SYSTEMS_SLICE}
+'''
+
+GET_CHANGED_SYSTEM_PROPERTIES = f'''
+SELECT
+  fsp.SPR_SYS_ID,
+  fsp.SPR_PRO_ID,
+  fp.PRO_NAME,
+  fsp.SPR_VALUE,
+  fsp.ORA_ROWSCN
+FROM
+  FGC_SYSTEM_PROPERTIES fsp
+INNER JOIN FGC_PROPERTIES fp
+ON fp.PRO_ID = fsp.SPR_PRO_ID
+INNER JOIN FGC_SYSTEMS fs
+ON fs.SYS_ID = fsp.SPR_SYS_ID
+WHERE
+  {SPARE_SYSTEMS_SLICE} AND
+  fsp.ORA_ROWSCN > :watermark
+'''
+
+GET_SYSTEM_PROPERTY_COUNTS = f'''
+SELECT
+  fsp.SPR_SYS_ID,
+  COUNT(*)
+FROM
+  FGC_SYSTEM_PROPERTIES fsp
+INNER JOIN FGC_SYSTEMS fs
+ON fs.SYS_ID = fsp.SPR_SYS_ID
+WHERE
+  {SPARE_SYSTEMS_SLICE}
+GROUP BY
+  fsp.SPR_SYS_ID
+'''
+
+GET_SYSTEM_PROPERTIES_BY_ID = '''
+SELECT
+  fsp.SPR_SYS_ID,
+  fsp.SPR_PRO_ID,
+  fp.PRO_NAME,
+  fsp.SPR_VALUE,
+  fsp.ORA_ROWSCN
+FROM
+  FGC_SYSTEM_PROPERTIES fsp
+INNER JOIN FGC_PROPERTIES fp
+ON fp.PRO_ID = fsp.SPR_PRO_ID
+WHERE
+  fsp.SPR_SYS_ID = :sys_id
+'''
+
+GET_SYSTEM_BY_ID = f'''
+SELECT
+  fs.SYS_ID,
+  fs.SYS_NAME,
+  fs.SYS_IS_SPARE_COMBINATION,
+  fs.ORA_ROWSCN
+FROM
+  FGC_SYSTEMS fs
+WHERE
+  {SPARE_SYSTEMS_SLICE} AND
+  fs.SYS_ID = :sys_id
+'''
+
+GET_CHANGED_COMPONENT_SYSTEMS = f'''
+SELECT
+  fcs.CS_SYS_ID,
+  fcs.CS_CMP_ID,
+  fcs.ORA_ROWSCN
+FROM
+  FGC_COMPONENT_SYSTEMS fcs
+INNER JOIN FGC_SYSTEMS fs
+ON fs.SYS_ID = fcs.CS_SYS_ID
+WHERE
+  {SPARE_SYSTEMS_SLICE} AND
+  fcs.ORA_ROWSCN > :watermark
+'''
+
+GET_SYSTEM_COMPONENTS_BY_ID = '''
+SELECT
+  fcs.CS_SYS_ID,
+  fcs.CS_CMP_ID
+FROM
+  FGC_COMPONENT_SYSTEMS fcs
+WHERE
+  fcs.CS_SYS_ID = :sys_id
+'''
+
+GET_COMPONENT_SYSTEMS = f'''
+SELECT
+  fcs.CS_SYS_ID,
+  fcs.CS_CMP_ID
+FROM
+  FGC_COMPONENT_SYSTEMS fcs
+INNER JOIN FGC_SYSTEMS fs
+ON fs.SYS_ID = fcs.CS_SYS_ID
+WHERE
+  {SPARE_SYSTEMS_SLICE}
+'''
+
+GET_SYSTEMS_PROPERTY_ROWS = '''
+SELECT
+  s.sys_name,
+  sp.pro_name,
+  sp.pro_id,
+  sp.value
+FROM
+  system_properties sp
+INNER JOIN systems s
+ON s.sys_id = sp.sys_id
+WHERE
+  s.sys_name IN ({placeholders})
+ORDER BY
+  s.sys_name
+'''
+
+class Replica:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._last_refresh = None
+        self._last_reconcile = None
+        self._dirty_names = set()
+        self._dirty_names_lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(REPLICA_SCHEMA)
+
+    @property
+    def is_populated(self):
+        with self._lock:
+            return self._has_watermarks()
+
+    def is_stale(self, max_age=REPLICA_MAX_AGE_SECONDS):
+        return self._last_refresh is None or time.monotonic() - self._last_refresh > max_age
+
+    def invalidate(self, system_names=None):
+        """Forces a refresh before the next read.
+
+        The given systems, and their combo systems (<name>_<channel>), are fetched again as a
+        whole. Without system names, the next refresh reconciles the whole slice.
+        """
+        if system_names is None:
+            self._last_reconcile = None
+
+        else:
+            with self._dirty_names_lock:
+                self._dirty_names.update(system_names)
+
+        self._last_refresh = None
+
+    def _has_watermarks(self):
+        return self._connection.execute('SELECT COUNT(*) FROM watermarks').fetchone()[0] > 0
+
+    def _get_watermark(self, table_name):
+        row = self._connection.execute('SELECT ora_rowscn FROM watermarks WHERE table_name = ?', (table_name,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_watermark(self, table_name, rows, column):
+        if rows:
+            watermark = max(self._get_watermark(table_name), max(row[column] for row in rows))
+            self._connection.execute('INSERT OR REPLACE INTO watermarks (table_name, ora_rowscn) VALUES (?, ?)', (table_name, watermark))
+
+        elif not self._get_watermark(table_name):
+            self._connection.execute('INSERT OR REPLACE INTO watermarks (table_name, ora_rowscn) VALUES (?, 0)', (table_name,))
+
+    def _get_changed_rows(self, statement, table_name, oracle_cursor):
+        data_get = {'class_id': SPARE_MANAGED_CLASS_ID, 'watermark': self._get_watermark(table_name)}
+        return oracle_cursor.execute(statement, data_get).fetchall()
+
+    def _refresh_changed_rows(self, oracle_cursor, fresh):
+        local_sys_ids = set() if fresh else {row[0] for row in self._connection.execute('SELECT sys_id FROM systems')}
+
+        systems = self._get_changed_rows(GET_CHANGED_SYSTEMS, 'systems', oracle_cursor)
+        self._connection.executemany('INSERT OR REPLACE INTO systems (sys_id, sys_name, is_combo, ora_rowscn) VALUES (?, ?, ?, ?)', systems)
+        self._set_watermark('systems', systems, 3)
+
+        system_properties = self._get_changed_rows(GET_CHANGED_SYSTEM_PROPERTIES, 'system_properties', oracle_cursor)
+        self._connection.executemany('INSERT OR REPLACE INTO system_properties (sys_id, pro_id, pro_name, value, ora_rowscn) VALUES (?, ?, ?, ?, ?)', system_properties)
+        self._set_watermark('system_properties', system_properties, 4)
+
+        links = self._get_changed_rows(GET_CHANGED_COMPONENT_SYSTEMS, 'component_systems', oracle_cursor)
+        self._connection.executemany('INSERT OR IGNORE INTO component_systems (sys_id, cmp_id) VALUES (?, ?)', [link[:2] for link in links])
+        self._set_watermark('component_systems', links, 2)
+
+        # The older rows of a system entering the slice are below the watermarks
+        entering = [row[0] for row in systems if row[0] not in local_sys_ids] if not fresh else list()
+
+        return len(systems) + len(system_properties) + len(links) + self._refetch_systems(entering, oracle_cursor)
+
+    def _refetch_systems(self, sys_ids, oracle_cursor):
+        rows_changed = 0
+
+        for sys_id in sys_ids:
+            data_get = {'class_id': SPARE_MANAGED_CLASS_ID, 'sys_id': sys_id}
+            system = oracle_cursor.execute(GET_SYSTEM_BY_ID, data_get).fetchall()
+            system_properties = oracle_cursor.execute(GET_SYSTEM_PROPERTIES_BY_ID, {'sys_id': sys_id}).fetchall() if system else list()
+            links = oracle_cursor.execute(GET_SYSTEM_COMPONENTS_BY_ID, {'sys_id': sys_id}).fetchall() if system else list()
+
+            for table in ('systems', 'system_properties', 'component_systems'):
+                rows_changed += self._connection.execute(f'DELETE FROM {table} WHERE sys_id = ?', (sys_id,)).rowcount
+
+            self._connection.executemany('INSERT INTO systems (sys_id, sys_name, is_combo, ora_rowscn) VALUES (?, ?, ?, ?)', system)
+            self._connection.executemany('INSERT INTO system_properties (sys_id, pro_id, pro_name, value, ora_rowscn) VALUES (?, ?, ?, ?, ?)', system_properties)
+            self._connection.executemany('INSERT INTO component_systems (sys_id, cmp_id) VALUES (?, ?)', links)
+            rows_changed += len(system) + len(system_properties) + len(links)
+
+        return rows_changed
+
+    def _get_local_sys_ids(self, system_names):
+        sys_ids = set()
+        for system_name in system_names:
+            combo_prefix = system_name + '_'
+            sys_ids.update(row[0] for row in self._connection.execute(
+                'SELECT sys_id FROM systems WHERE sys_name = ? OR substr(sys_name, 1, ?) = ?', (system_name, len(combo_prefix), combo_prefix)))
+
+        return sorted(sys_ids)
+
+    def _reconcile(self, oracle_cursor):
+        data_get = {'class_id': SPARE_MANAGED_CLASS_ID}
+
+        oracle_keys = {row[0] for row in oracle_cursor.execute(GET_SYSTEM_KEYS, data_get)}
+        local_keys  = {row[0] for row in self._connection.execute('SELECT sys_id FROM systems')}
+        deleted = [(sys_id,) for sys_id in local_keys - oracle_keys]
+
+        rows_changed = len(deleted)
+        for table in ('systems', 'system_properties', 'component_systems'):
+            self._connection.executemany(f'DELETE FROM {table} WHERE sys_id = ?', deleted)
+
+        # Systems whose property count differs from the local copy are fetched again as a whole
+        oracle_counts = dict(oracle_cursor.execute(GET_SYSTEM_PROPERTY_COUNTS, data_get))
+        local_counts  = dict(self._connection.execute('SELECT sys_id, COUNT(*) FROM system_properties GROUP BY sys_id'))
+
+        for sys_id in sorted(set(oracle_counts) | set(local_counts)):
+            if oracle_counts.get(sys_id, 0) == local_counts.get(sys_id, 0):
+                continue
+
+            system_rows = oracle_cursor.execute(GET_SYSTEM_PROPERTIES_BY_ID, {'sys_id': sys_id}).fetchall()
+            self._connection.execute('DELETE FROM system_properties WHERE sys_id = ?', (sys_id,))
+            self._connection.executemany('INSERT INTO system_properties (sys_id, pro_id, pro_name, value, ora_rowscn) VALUES (?, ?, ?, ?, ?)', system_rows)
+            rows_changed += local_counts.get(sys_id, 0) + len(system_rows)
+
+        # Links are whole-row keys, so comparing the key sets gives the deleted ones
+        oracle_links = set(oracle_cursor.execute(GET_COMPONENT_SYSTEMS, data_get))
+        local_links  = set(self._connection.execute('SELECT sys_id, cmp_id FROM component_systems'))
+
+        self._connection.executemany('INSERT INTO component_systems (sys_id, cmp_id) VALUES (?, ?)', sorted(oracle_links - local_links))
+        self._connection.executemany('DELETE FROM component_systems WHERE sys_id = ? AND cmp_id = ?', sorted(local_links - oracle_links))
+
+        return rows_changed + len(oracle_links ^ local_links)
+
+    def refresh(self, oracle_cursor, reconcile=False) -> int:
+        """Brings the replica up to date from an Oracle cursor. Returns the number of rows changed locally.
+
+        The whole slice is reconciled if requested, or if it has not been for REPLICA_RECONCILE_SECONDS.
+        """
+        oracle_cursor.arraysize = REPLICA_FETCH_ARRAYSIZE
+
+        with self._dirty_names_lock:
+            dirty_names, self._dirty_names = self._dirty_names, set()
+
+        try:
+            with self._lock:
+                now = time.monotonic()
+                fresh = not self._has_watermarks()
+                reconcile = not fresh and (reconcile or self._last_reconcile is None or now - self._last_reconcile > REPLICA_RECONCILE_SECONDS)
+
+                with self._connection:
+                    rows_changed = self._refresh_changed_rows(oracle_cursor, fresh)
+
+                    if reconcile:
+                        rows_changed += self._reconcile(oracle_cursor)
+
+                    elif dirty_names and not fresh:
+                        rows_changed += self._refetch_systems(self._get_local_sys_ids(dirty_names), oracle_cursor)
+
+                if fresh or reconcile:
+                    self._last_reconcile = now
+
+                self._last_refresh = now
+
+        except BaseException:
+            with self._dirty_names_lock:
+                self._dirty_names.update(dirty_names)
+
+            raise
+
+        return rows_changed
+
+    def get_unknown_systems(self, system_names) -> set:
+        """Returns the names, among system_names, of the systems the replica does not hold."""
+        with self._lock:
+            return {system_name for system_name in set(system_names)
+                    if self._connection.execute('SELECT 1 FROM systems WHERE sys_name = ?', (system_name,)).fetchone() is None}
+
+    def get_combo_systems(self) -> list:
+        with self._lock:
+            return [row[0] for row in self._connection.execute('SELECT sys_name FROM systems WHERE is_combo = 1 ORDER BY sys_name')]
+
+    def get_system_id(self, system_name):
+        with self._lock:
+            row = self._connection.execute('SELECT sys_id FROM systems WHERE sys_name = ?', (system_name,)).fetchone()
+
+        return row[0] if row else None
+
+    def get_systems_property_rows(self, system_names) -> list:
+        """Returns (system name, property name, property id, value) rows, ordered by system name."""
+        names = sorted(set(system_names))
+        rows = list()
+
+        with self._lock:
+            for start in range(0, len(names), REPLICA_MAX_NAMES):
+                names_chunk = names[start:start + REPLICA_MAX_NAMES]
+                placeholders = ', '.join('?' * len(names_chunk))
+                rows.extend(self._connection.execute(GET_SYSTEMS_PROPERTY_ROWS.format(placeholders=placeholders), names_chunk))
+
+        return rows
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+_replicas = dict()
+_replicas_lock = threading.Lock()
+
+def enable(db_instance: str, path=None) -> Replica:
+    """Serves the reads of db_instance from a local replica stored at path.
+
+    The default path is <SPARE_MANAGER_REPLICA_DIR or ~/.cache/spare_manager>/<instance>.sqlite.
+    """
+    db_instance_lc = db_instance.lower()
+
+    if path is None:
+        replica_dir = os.environ.get(REPLICA_DIR_ENV_VAR) or Path.home() / '.cache' / 'spare_manager'
+        path = Path(replica_dir) / f'{db_instance_lc}.sqlite'
+
+    with _replicas_lock:
+        if db_instance_lc not in _replicas:
+            _replicas[db_instance_lc] = Replica(path)
+
+        return _replicas[db_instance_lc]
+
+def disable(db_instance: str) -> None:
+    with _replicas_lock:
+        local_replica = _replicas.pop(db_instance.lower(), None)
+
+    if local_replica is not None:
+        local_replica.close()
+
+def get_replica(db_instance: str):
+    """Returns the replica of db_instance, or None if reads go straight to Oracle."""
+    try:
+        return _replicas[db_instance.lower()]
+
+    except KeyError:
+        if os.environ.get(REPLICA_DIR_ENV_VAR):
+            return enable(db_instance)
+
+        return None
+
+def invalidate(db_instance: str, system_names=None) -> None:
+    """Forces a refresh before the next read, e.g. after writing to Oracle (see Replica.invalidate)."""
+    local_replica = _replicas.get(db_instance.lower())
+    if local_replica is not None:
+        local_replica.invalidate(system_names)
+
+# EOF
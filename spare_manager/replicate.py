@@ -0,0 +1,202 @@
+"""Replicates the operational-spare combo systems of one database instance into another.
+
+The combo systems, their component links and their system properties are compared between the
+source and the target instances, and only the differences are written to the target:
+    - combo systems missing in the target are inserted
+    - component links and property values missing or different in the target are written
+    - component links and properties of a replicated combo that the source does not have are removed
+Combo systems that only exist in the target are left alone.
+
+The combos are processed in chunks of REPLICATION_CHUNK_SIZE, each chunk in its own transaction,
+with array DML: a chunk's new combo systems are committed together with their links and
+properties. Systems are matched by name and properties by property name; system types and
+components are assumed to share their ids across instances. Properties whose name the target
+does not know are not written and are listed in the report.
+"""
+import argparse
+from collections import namedtuple
+
+from spare_manager import config_blender as blender
+from spare_manager import replica
+
+REPLICATION_CHUNK_SIZE = 200
+
+GET_COMBO_SYSTEMS = '''
+SELECT
+  fs.SYS_NAME,
+  fs.SYS_ID,
+  fs.SYS_TP_ID,
+  fs.SYS_CLASS_ID
+FROM
+  FGC_SYSTEMS fs
+WHERE
+  fs.SYS_IS_SPARE_COMBINATION = 1
+'''
+
+GET_SYSTEM_IDS = '''
+SELECT
+  fs.SYS_NAME,
+  fs.SYS_ID
+FROM
+  FGC_SYSTEMS fs
+WHERE
+  fs.SYS_NAME IN (SELECT COLUMN_VALUE FROM TABLE(:system_names))
+'''
+
+INSERT_REPLICATED_COMBO_SYSTEM = '''
+INSERT INTO FGC_SYSTEMS
+(SYS_NAME, SYS_TP_ID, SYS_CLASS_ID, SYS_IS_OBSOLETE, SYS_IS_SPARE_COMBINATION)
+VALUES
+(:1, :2, :3, 0, 1)
+'''
+
+GET_SYSTEMS_COMPONENTS = '''
+SELECT
+  fs.SYS_NAME,
+  fcs.CS_CMP_ID
+FROM
+  FGC_COMPONENT_SYSTEMS fcs
+INNER JOIN FGC_SYSTEMS fs
+ON fs.SYS_ID = fcs.CS_SYS_ID
+WHERE
+  fs.SYS_NAME IN (SELECT COLUMN_VALUE FROM TABLE(:system_names))
+'''
+
+GET_PROPERTY_IDS = '''
+SELECT
+  fp.PRO_NAME,
+  fp.PRO_ID
+FROM
+  FGC_PROPERTIES fp
+WHERE
+  fp.PRO_NAME IN (SELECT COLUMN_VALUE FROM TABLE(:property_names))
+'''
+
+ComboSystem = namedtuple('ComboSystem', 'name, sys_id, tp_id, class_id')
+ReplicationReport = namedtuple('ReplicationReport', 'combos_inserted, links_inserted, links_deleted, properties_merged, properties_deleted, unmatched_properties')
+
+def _get_combo_systems(cursor):
+    return {row[0]: ComboSystem(*row) for row in cursor.execute(GET_COMBO_SYSTEMS)}
+
+def _get_systems_components(system_names, cursor):
+    names = blender._new_names_collection(system_names, cursor)
+    return set(cursor.execute(GET_SYSTEMS_COMPONENTS, {'system_names': names}))
+
+def _get_system_ids(system_names, cursor):
+    names = blender._new_names_collection(system_names, cursor)
+    return dict(cursor.execute(GET_SYSTEM_IDS, {'system_names': names}))
+
+def _get_property_ids(property_names, cursor):
+    names = blender._new_names_collection(sorted(property_names), cursor)
+    return dict(cursor.execute(GET_PROPERTY_IDS, {'property_names': names}))
+
+def _diff_properties_by_name(source_properties, target_properties):
+    to_merge  = [p for name, p in source_properties.items() if name not in target_properties or target_properties[name].value != p.value]
+    to_delete = [p for name, p in target_properties.items() if name not in source_properties]
+    return to_merge, to_delete
+
+def _replicate_chunk(combo_names, combos_to_insert, source_cursor, target_cursor, dry_run):
+    """Replicates one chunk of combo systems, without committing. Returns the ReplicationReport of the chunk."""
+    if combos_to_insert and not dry_run:
+        target_cursor.executemany(INSERT_REPLICATED_COMBO_SYSTEM, [(c.name, c.tp_id, c.class_id) for c in combos_to_insert])
+
+    source_links = _get_systems_components(combo_names, source_cursor)
+    target_links = _get_systems_components(combo_names, target_cursor)
+    source_properties = blender._get_systems_properties(combo_names, source_cursor)
+    target_properties = blender._get_systems_properties(combo_names, target_cursor)
+    target_sys_ids = _get_system_ids(combo_names, target_cursor)
+
+    links_to_insert = sorted(source_links - target_links)
+    links_to_delete = sorted(target_links - source_links)
+
+    properties_to_merge  = list()
+    properties_to_delete = list()
+    for combo_name in combo_names:
+        to_merge, to_delete = _diff_properties_by_name(source_properties[combo_name], target_properties[combo_name])
+        properties_to_merge.extend((combo_name, p) for p in to_merge)
+        properties_to_delete.extend((combo_name, p) for p in to_delete)
+
+    target_property_ids = _get_property_ids({p.name for _, p in properties_to_merge}, target_cursor) if properties_to_merge else dict()
+    unmatched_properties = sorted({p.name for _, p in properties_to_merge if p.name not in target_property_ids})
+    properties_to_merge = [(name, p) for name, p in properties_to_merge if p.name in target_property_ids]
+
+    if not dry_run:
+        if links_to_insert:
+            target_cursor.executemany(blender.LINK_COMPONENT_TO_SYSTEM, [(target_sys_ids[name], cmp_id) for name, cmp_id in links_to_insert])
+
+        if links_to_delete:
+            target_cursor.executemany(blender.UNLINK_COMPONENT_FROM_SYSTEM, [(target_sys_ids[name], cmp_id) for name, cmp_id in links_to_delete])
+
+        if properties_to_merge:
+            target_cursor.executemany(blender.MERGE_SYSTEM_PROPERTY,
+                                      [(target_sys_ids[name], target_property_ids[p.name], p.value) for name, p in properties_to_merge])
+
+        if properties_to_delete:
+            target_cursor.executemany(blender.DELETE_SYSTEM_PROPERTY, [(target_sys_ids[name], p.id) for name, p in properties_to_delete])
+
+    return ReplicationReport(len(combos_to_insert), len(links_to_insert), len(links_to_delete),
+                             len(properties_to_merge), len(properties_to_delete), unmatched_properties)
+
+def replicate_combo_systems(source_instance: str, target_instance: str, dry_run=False, allow_production=False) -> ReplicationReport:
+    """Makes the combo systems of target_instance match those of source_instance.
+
+    With dry_run, the differences are counted but nothing is written. Writing to the
+    production instance requires allow_production.
+    """
+    if source_instance.lower() == target_instance.lower():
+        raise ValueError('Source and target database instances cannot be the same!')
+
+    if target_instance.lower() == 'pro' and not allow_production and not dry_run:
+        raise ValueError('Replicating into the production database must be explicitly allowed!')
+
+    counts = [0, 0, 0, 0, 0]
+    unmatched_properties = set()
+
+    # Replication is a long batch job: each round trip is bounded, but not the whole operation
+    with blender._db_connection(source_instance, operation_timeout=0) as source_connection, \
+         blender._db_connection(target_instance, operation_timeout=0) as target_connection:
+        target_connection.autocommit = False
+
+        with source_connection.cursor() as source_cursor, target_connection.cursor() as target_cursor:
+            source_combos = _get_combo_systems(source_cursor)
+            target_combos = _get_combo_systems(target_cursor)
+
+            combo_names = sorted(source_combos)
+            for start in range(0, len(combo_names), REPLICATION_CHUNK_SIZE):
+                chunk = combo_names[start:start + REPLICATION_CHUNK_SIZE]
+                combos_to_insert = [source_combos[name] for name in chunk if name not in target_combos]
+                chunk_report = _replicate_chunk(chunk, combos_to_insert, source_cursor, target_cursor, dry_run)
+
+                for i, count in enumerate(chunk_report[:len(counts)]):
+                    counts[i] += count
+
+                unmatched_properties.update(chunk_report.unmatched_properties)
+
+                if not dry_run:
+                    blender._commit(target_connection, target_instance)
+
+    if not dry_run:
+        replica.invalidate(target_instance)
+
+    return ReplicationReport(*counts, sorted(unmatched_properties))
+
+def configure_parser(parser: 'argparse.ArgumentParser') -> None:
+    parser.description = __doc__
+    parser.formatter_class = argparse.RawDescriptionHelpFormatter
+
+    parser.add_argument('source', metavar='SOURCE', type=str, help='Database instance to copy the combo systems from (PRO or DEV)')
+    parser.add_argument('target', metavar='TARGET', type=str, help='Database instance to copy the combo systems to (PRO or DEV)')
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true', help='Only count the differences, do not write anything')
+    parser.add_argument('--allow-production', dest='allow_production', action='store_true', help='Allow writing to the production database')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    configure_parser(parser)
+    args = parser.parse_args()
+    report = replicate_combo_systems(args.source, args.target, args.dry_run, args.allow_production)
+
+    for field, value in report._asdict().items():
+        if isinstance(value, list):
+            value = ', '.join(value) or '-'
+
+        print(f'{field.replace("_", " ").capitalize()}: {value}')
@@ -1,16 +1,21 @@
 '''
-Usage sm_main [-c|-a]
+Usage sm_main [-c|-a|-s] [-p|-P]
 Options:
     -c: Launches the GUI to create a spare-operational configuration
     -a: Launches the GUI to activate a spare-operational configuration already created
+    -s: Launches the GUI showing the status of all spare-operational configurations
+    -p: Logs the time spent in each start-up phase and user action, and prints them on exit
+    -P: Same as -p, and writes a cProfile capture of the session to a file
 '''
 
 import importlib
+import os
 import sys
 from PyQt5.QtWidgets import QApplication
 
 __options_to_gui_module = {'-c': 'spare_manager.create_configuration', 
-                            '-a': 'spare_manager.activate_configuration'}
+                            '-a': 'spare_manager.activate_configuration',
+                            '-s': 'spare_manager.status_configuration'}
 try:
     option = sys.argv[1]
 
@@ -18,10 +23,20 @@ except IndexError:
     print(f'Missing option! {__doc__}')
     sys.exit(2)
 
-if option not in ['-c', '-a']:
+if option not in __options_to_gui_module:
     print(f'Invalid option! Available options: {__doc__}')
     sys.exit(2)
 
+profile_option = sys.argv[2] if len(sys.argv) > 2 else None
+
+if profile_option not in [None, '-p', '-P']:
+    print(f'Invalid option! Available options: {__doc__}')
+    sys.exit(2)
+
+# Profiling has to be on before the first import of the package: spare_manager/__init__.py
+# imports the windows, which parse the name file
+if profile_option:
+    os.environ['SPARE_MANAGER_PROFILE'] = 'cprofile' if profile_option == '-P' else '1'
 
 # import spare_manager.view
 try:
@@ -31,8 +46,18 @@ except ImportError:
     print(f'Could not import module {__options_to_gui_module[option]}')
     sys.exit(1)
 
-app = QApplication(list())
-app.setStyle('Oxygen')
-spare_manager = gui_module.SpareManagerWindow()
-sys.exit(app.exec_())
-# EOF
\ No newline at end of file
+from spare_manager import profiling
+
+with profiling.stage('Start-up'):
+    app = QApplication(list())
+    app.setStyle('Oxygen')
+    spare_manager = gui_module.SpareManagerWindow()
+
+exit_code = app.exec_()
+
+# The status window has no activity box: the timings are only visible in the terminal
+if profile_option:
+    print(profiling.summary())
+
+sys.exit(exit_code)
+# EOF
@@ -0,0 +1,88 @@
+"""Recommends the spare FGCs that can replace an operational FGC.
+
+A spare is compatible with an operational if it belongs to the same class and to the same
+gateway, and is not the operational itself. Compatible spares are looked up in the device
+table; whether each one is already combined with the operational, and whether another
+operational is currently running on it, is found with a single database query.
+"""
+from collections import namedtuple
+
+import cx_Oracle
+
+from spare_manager import config_blender as blender
+from spare_manager.device_table import get_device_table
+
+GET_SPARE_USAGE = '''
+SELECT
+  fs.SYS_NAME,
+  fs.SYS_IS_SPARE_COMBINATION,
+  fsp.SPR_VALUE
+FROM
+  FGC_SYSTEMS fs
+LEFT JOIN FGC_PROPERTIES fp
+ON fp.PRO_NAME = 'DEVICE.SPARE_ID'
+LEFT JOIN FGC_SYSTEM_PROPERTIES fsp
+ON fsp.SPR_SYS_ID = fs.SYS_ID AND fsp.SPR_PRO_ID = fp.PRO_ID
+WHERE
+  fs.SYS_NAME IN (SELECT COLUMN_VALUE FROM TABLE(:system_names))
+'''
+
+SpareCandidate = namedtuple('SpareCandidate', 'name, channel, combo_exists, in_use_by')
+
+def get_compatible_spares(operational: str) -> list:
+    """Returns the names of the devices that could replace operational, from the name file only."""
+    device_table = get_device_table()
+    op_device = device_table.get(operational)
+
+    return [name for name in device_table.filter(class_id=op_device.class_id, gateway=op_device.gateway) if name != operational]
+
+def _rank(candidate):
+    # Free spares first, then those not yet combined with the operational
+    return (candidate.in_use_by is not None, candidate.combo_exists, candidate.name)
+
+def _get_spare_usage(system_names, cursor):
+    names = blender._new_names_collection(sorted(system_names), cursor)
+    return cursor.execute(GET_SPARE_USAGE, {'system_names': names}).fetchall()
+
+def recommend_spares(operational: str, db_instance: str) -> list:
+    """Returns a ranked list of SpareCandidate for operational. Database errors are raised as RuntimeError."""
+    device_table = get_device_table()
+    spares = get_compatible_spares(operational)
+    if not spares:
+        return list()
+
+    combo_names = {blender._generate_combo_system_name(operational, spare): spare for spare in spares}
+    gateway_devices = device_table.filter(gateway=device_table.gateway(operational))
+
+    try:
+        with blender._db_connection(db_instance) as db_connection:
+            with db_connection.cursor() as cursor:
+                spare_usage = _get_spare_usage(set(combo_names) | set(gateway_devices), cursor)
+
+    except cx_Oracle.Error as oe:
+        raise RuntimeError(str(oe)) from oe
+
+    existing_combos = set()
+    users_by_channel = dict()
+    for sys_name, is_combo, spare_id in spare_usage:
+        if is_combo:
+            existing_combos.add(sys_name)
+            continue
+
+        try:
+            channel = int(spare_id)
+
+        except (TypeError, ValueError):
+            continue
+
+        if channel and sys_name != operational:
+            users_by_channel[channel] = sys_name
+
+    candidates = list()
+    for combo_name, spare in combo_names.items():
+        channel = device_table.channel(spare)
+        candidates.append(SpareCandidate(spare, channel, combo_name in existing_combos, users_by_channel.get(channel)))
+
+    return sorted(candidates, key=_rank)
+
+# EOF
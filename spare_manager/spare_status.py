@@ -0,0 +1,42 @@
+"""Prints the status of every operational-spare combination.
+
+For each combo system it shows the operational, the spare, the system id of the combination
+and whether the combination is active, i.e. whether the operational's DEVICE.SPARE_ID
+currently points to the spare.
+"""
+import argparse
+import re
+
+import pyfgc_name
+
+from spare_manager import config_blender as blender
+
+STATUS_HEADERS = ('OPERATIONAL', 'SPARE', 'COMBO SYS ID', 'ACTIVE')
+
+def format_spare_status(spare_status) -> str:
+    rows = [STATUS_HEADERS]
+    rows.extend((s.operational, s.spare or '?', str(s.combo_sys_id), 'YES' if s.active else 'no') for s in spare_status)
+    widths = [max(len(row[col]) for row in rows) for col in range(len(STATUS_HEADERS))]
+
+    return '\n'.join('  '.join(value.ljust(width) for value, width in zip(row, widths)) for row in rows)
+
+def filter_spare_status(spare_status, pattern=None, active_only=False) -> list:
+    regex = re.compile(pattern.upper()) if pattern else None
+
+    return [s for s in spare_status
+            if (not active_only or s.active) and (regex is None or regex.search(s.operational) or regex.search(s.spare))]
+
+def configure_parser(parser: 'argparse.ArgumentParser') -> None:
+    parser.description = __doc__
+
+    parser.add_argument('database', metavar='DATABASE', type=str, help='PRO(duction) or DEV(evelopment) database')
+    parser.add_argument('--active', action='store_true', help='Show only the active configurations')
+    parser.add_argument('--filter', dest='pattern', type=str, default=None, help='Show only operational or spare FGCs matching this regular expression')
+
+if __name__ == '__main__':
+    pyfgc_name.read_name_file()
+    parser = argparse.ArgumentParser()
+    configure_parser(parser)
+    args = parser.parse_args()
+    spare_status = blender.get_spare_status(args.database)
+    print(format_spare_status(filter_spare_status(spare_status, args.pattern, args.active)))
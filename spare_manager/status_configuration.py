@@ -0,0 +1,101 @@
+import logging
+import time
+
+from PyQt5.QtCore    import Qt
+from PyQt5.QtWidgets import QMainWindow, QWidget
+from PyQt5.QtWidgets import QHBoxLayout, QVBoxLayout
+from PyQt5.QtWidgets import (QAbstractItemView,
+                            QCheckBox,
+                            QHeaderView,
+                            QLineEdit,
+                            QMessageBox,
+                            QPushButton,
+                            QTableView)
+
+from spare_manager import config_blender as blender
+from spare_manager import profiling
+from spare_manager.model import SpareStatusModel, SpareStatusFilterModel
+
+DB_INSTANCE = 'pro'
+
+class SpareManagerWindow(QMainWindow):
+    """Fleet-wide status of the operational-spare configurations.
+
+    Arguments:
+        QMainWindow {[type]} -- [description]
+    """
+    def __init__(self, parent=None, db_instance=DB_INSTANCE):
+        super().__init__(parent)
+
+        self._db_instance = db_instance
+        self._model = SpareStatusModel()
+        self._filter_model = SpareStatusFilterModel()
+        self._filter_model.setSourceModel(self._model)
+
+        self._build_widgets()
+        self._set_signals_slots()
+
+        self.setWindowTitle('Spare system manager - Status of configurations')
+        self.resize(640, 480)
+        self.show()
+
+        self.refresh()
+
+    def _build_widgets(self):
+        self.filterLineEdit = QLineEdit()
+        self.filterLineEdit.setPlaceholderText('Filter by operational or spare FGC')
+        self.activeonlyCheckBox = QCheckBox('Active only')
+        self.refreshPushButton = QPushButton('Refresh')
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.filterLineEdit)
+        filter_layout.addWidget(self.activeonlyCheckBox)
+        filter_layout.addWidget(self.refreshPushButton)
+
+        self.statusTableView = QTableView()
+        self.statusTableView.setModel(self._filter_model)
+        self.statusTableView.setSortingEnabled(True)
+        self.statusTableView.sortByColumn(0, Qt.AscendingOrder)
+        self.statusTableView.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.statusTableView.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.statusTableView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+        main_layout = QVBoxLayout()
+        main_layout.addLayout(filter_layout)
+        main_layout.addWidget(self.statusTableView)
+
+        central_widget = QWidget()
+        central_widget.setLayout(main_layout)
+        self.setCentralWidget(central_widget)
+
+    def _set_signals_slots(self):
+        self.filterLineEdit.textChanged.connect(lambda text: self._filter_model.setFilterRegExp(text))
+        self.activeonlyCheckBox.toggled.connect(lambda checked: self._filter_model.setActiveOnly(checked))
+        self.refreshPushButton.clicked.connect(lambda: self.refresh())
+
+    @profiling.timed('Refresh configurations status')
+    def refresh(self):
+        start = time.perf_counter()
+
+        try:
+            spare_status = blender.get_spare_status(self._db_instance)
+
+        except (FileNotFoundError, RuntimeError) as e:
+            self._show_error_popup_window(str(e))
+            logging.info(f'Could not load the status of the operational-spare configurations! {e}')
+            return
+
+        self._model.setRows(spare_status)
+
+        active = sum(1 for s in spare_status if s.active)
+        msg = f'{len(spare_status)} configurations, {active} active (loaded in {time.perf_counter() - start:.2f} s)'
+        self.statusBar().showMessage(msg)
+        logging.info(msg)
+
+    def _show_error_popup_window(self, message):
+        msg = QMessageBox()
+        msg.setWindowTitle('This is not good...')
+        msg.setText(message)
+        _ = msg.exec_()
+
+# EOF
@@ -0,0 +1,16 @@
+from contextlib import contextmanager
+from unittest import mock
+
+import pytest
+
+import spare_manager.config_blender as blender
+
+
+@contextmanager
+def _fake_db_connection(db_instance, operation_timeout=None):
+    yield mock.MagicMock()
+
+@pytest.fixture
+def fake_db_connection(monkeypatch):
+    """Replaces the database connections of config_blender with mocks."""
+    monkeypatch.setattr(blender, '_db_connection', _fake_db_connection)
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import spare_manager.config_blender as blender
+import spare_manager.async_blender as async_blender
+
+
+@pytest.fixture
+def limited_dev_instance():
+    async_blender._limiters.pop('dev', None)
+    async_blender.set_concurrency_limit('dev', 2)
+    yield 'dev'
+    async_blender._concurrency_limits.pop('dev', None)
+    async_blender._limiters.pop('dev', None)
+
+def test_concurrency_limit_is_respected(monkeypatch, limited_dev_instance):
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def fake_get_system_id(combo_system_name, db_instance):
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+
+        time.sleep(0.05)
+
+        with lock:
+            running -= 1
+
+        return len(combo_system_name)
+
+    monkeypatch.setattr(blender, 'get_system_id', fake_get_system_id)
+
+    async def run_all():
+        return await asyncio.gather(*[async_blender.get_system_id('X' * n, limited_dev_instance) for n in range(1, 7)])
+
+    results = asyncio.get_event_loop().run_until_complete(run_all())
+
+    assert results == [1, 2, 3, 4, 5, 6]
+    assert max_running <= 2
+
+def test_concurrency_limit_cannot_exceed_pool_size():
+    with pytest.raises(ValueError):
+        async_blender.set_concurrency_limit('dev', blender.get_pool_size('dev') + 1)
+
+def test_concurrency_limit_rejects_unknown_instance():
+    with pytest.raises(KeyError):
+        async_blender.set_concurrency_limit('foo', 1)
+
+def _blocking_get_system_id(monkeypatch):
+    release = threading.Event()
+    running = list()
+
+    def fake_get_system_id(combo_system_name, db_instance):
+        running.append(combo_system_name)
+        release.wait(1)
+        return combo_system_name
+
+    monkeypatch.setattr(blender, 'get_system_id', fake_get_system_id)
+    return release, running
+
+def test_cancelled_operation_keeps_its_slot_until_its_thread_is_done(monkeypatch, limited_dev_instance):
+    release, running = _blocking_get_system_id(monkeypatch)
+    async_blender.set_concurrency_limit(limited_dev_instance, 1)
+
+    async def run():
+        first = asyncio.ensure_future(async_blender.get_system_id('A', limited_dev_instance))
+        await asyncio.sleep(0.05)
+        first.cancel()
+
+        second = asyncio.ensure_future(async_blender.get_system_id('B', limited_dev_instance))
+        await asyncio.sleep(0.05)
+        started_while_first_runs = list(running)
+
+        release.set()
+        return started_while_first_runs, await second
+
+    assert asyncio.get_event_loop().run_until_complete(run()) == (['A'], 'B')
+
+def test_concurrency_limit_raised_on_a_running_loop(monkeypatch, limited_dev_instance):
+    release, running = _blocking_get_system_id(monkeypatch)
+    async_blender.set_concurrency_limit(limited_dev_instance, 1)
+
+    async def run():
+        tasks = [asyncio.ensure_future(async_blender.get_system_id(name, limited_dev_instance)) for name in 'AB']
+        await asyncio.sleep(0.05)
+        running_before = len(running)
+
+        async_blender.set_concurrency_limit(limited_dev_instance, 2)
+        await asyncio.sleep(0.05)
+        running_after = len(running)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        return running_before, running_after
+
+    assert asyncio.get_event_loop().run_until_complete(run()) == (1, 2)
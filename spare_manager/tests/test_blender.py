@@ -1,6 +1,10 @@
+import time
+from unittest import mock
+
 import pytest
 
 import spare_manager.config_blender as blender
+from spare_manager.device_table import DeviceTable
 
 def run_security_checks_throws_assertionerror_if_different_classes(op, spare):
     with pytest.raises(AssertionError):
@@ -15,3 +19,249 @@ def create_mixed_config_returns_spare_config_if_op_empty(op, spare):
 
 def create_mixed_config_returns_op_config_if_spare_empty(op, spare):
     pass
+
+def test_diff_system_properties_only_returns_changed_rows():
+    target = {'A': blender.Property(1, 'A', '1'), 'B': blender.Property(2, 'B', '2'), 'C': blender.Property(3, 'C', '3')}
+    current = {'A': blender.Property(1, 'A', '1'), 'B': blender.Property(2, 'B', '0'), 'D': blender.Property(4, 'D', '4')}
+
+    to_insert, to_update, to_delete = blender._diff_system_properties(target, current)
+
+    assert [p.name for p in to_insert] == ['C']
+    assert [p.name for p in to_update] == ['B']
+    assert [p.name for p in to_delete] == ['D']
+
+def test_diff_combo_properties_follows_from_spare_converter(monkeypatch):
+    monkeypatch.setattr(blender.properties, 'fgc_properties', {'A': {}, 'B': {'from_spare_converter': 1}})
+    op    = {'A': blender.Property(1, 'A', 'op'),    'B': blender.Property(2, 'B', 'op')}
+    spare = {'A': blender.Property(1, 'A', 'spare'), 'B': blender.Property(2, 'B', 'spare')}
+    combo = {'A': blender.Property(1, 'A', 'op'),    'B': blender.Property(2, 'B', 'op'), 'C': blender.Property(3, 'C', 'x')}
+
+    prop_diffs = {p.name: p for p in blender._diff_combo_properties(op, spare, combo)}
+
+    assert prop_diffs['A'].source == blender.PROPERTY_SOURCE_OPERATIONAL and prop_diffs['A'].matches
+    assert prop_diffs['B'].source == blender.PROPERTY_SOURCE_SPARE and not prop_diffs['B'].matches
+    assert prop_diffs['C'].source is None and prop_diffs['C'].operational is None
+
+def test_blend_reports_errors_instead_of_skipping(monkeypatch):
+    monkeypatch.setattr(blender.properties, 'fgc_properties', {'A': {}})
+    op    = {'A': blender.Property(1, 'A', 'op'),    'Z': blender.Property(9, 'Z', 'op')}
+    spare = {'A': blender.Property(1, 'A', 'spare')}
+
+    combo, errors = blender._blend_system_properties(op, spare)
+
+    assert combo == {'A': op['A']}
+    assert len(errors) == 2
+
+class FakeLock:
+    def __init__(self, busy_attempts):
+        self.busy_attempts = busy_attempts
+        self.attempts = 0
+
+    def __call__(self, operational, cursor):
+        self.attempts += 1
+        if self.attempts <= self.busy_attempts:
+            raise blender.OperationalBusyError(f'{operational} busy')
+
+@pytest.fixture
+def no_database(monkeypatch, fake_db_connection):
+    monkeypatch.setattr(blender, 'LOCK_RETRY_BACKOFF_SECONDS', 0)
+
+def test_locked_work_retried_while_operational_busy(monkeypatch, no_database):
+    fake_lock = FakeLock(busy_attempts=blender.LOCK_RETRIES)
+    monkeypatch.setattr(blender, '_lock_operational', fake_lock)
+
+    assert blender._run_locked('RFMAG.866.19.ETH1', 'dev', lambda cursor: 'done') == 'done'
+    assert fake_lock.attempts == blender.LOCK_RETRIES + 1
+
+def test_busy_error_raised_when_retries_exhausted(monkeypatch, no_database):
+    monkeypatch.setattr(blender, '_lock_operational', FakeLock(busy_attempts=blender.LOCK_RETRIES + 1))
+
+    with pytest.raises(blender.OperationalBusyError):
+        blender._run_locked('RFMAG.866.19.ETH1', 'dev', lambda cursor: 'done')
+
+class FakeOracleError:
+    def __init__(self, code, message):
+        self.code = code
+        self.message = message
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    pool = mock.MagicMock()
+    monkeypatch.setattr(blender, '_get_session_pool', lambda db_instance: pool)
+    return pool
+
+def test_call_timeout_raised_as_db_timeout_error(fake_pool):
+    with pytest.raises(blender.DbTimeoutError):
+        with blender._db_connection('dev'):
+            raise blender.cx_Oracle.DatabaseError(FakeOracleError(0, 'DPI-1067: call timeout of 10000 ms exceeded with ORA-3156'))
+
+    fake_pool.release.assert_called_once()
+
+def test_other_database_errors_are_not_timeouts(fake_pool):
+    with pytest.raises(blender.cx_Oracle.DatabaseError):
+        with blender._db_connection('dev'):
+            raise blender.cx_Oracle.DatabaseError(FakeOracleError(1, 'ORA-00001: unique constraint violated'))
+
+def test_statement_cancelled_when_operation_budget_exceeded(fake_pool):
+    with pytest.raises(blender.DbTimeoutError):
+        with blender._db_connection('dev', operation_timeout=0.01) as db_connection:
+            time.sleep(0.1)
+
+    db_connection.cancel.assert_called_once()
+    db_connection.rollback.assert_called_once()
+
+def test_late_locked_work_never_committed(monkeypatch, fake_pool):
+    monkeypatch.setitem(blender._db_timeouts, 'dev', blender.DEFAULT_DB_TIMEOUTS._replace(operation=0.01))
+    monkeypatch.setattr(blender, '_lock_operational', lambda operational, cursor: None)
+
+    with pytest.raises(blender.DbTimeoutError):
+        blender._run_locked('RFMAG.866.19.ETH1', 'dev', lambda cursor: time.sleep(0.1))
+
+    db_connection = fake_pool.acquire.return_value
+    db_connection.commit.assert_not_called()
+    db_connection.rollback.assert_called_once()
+
+def test_spare_status_resolves_spares_per_gateway(monkeypatch, fake_pool):
+    devices = {'RPAGM.866.04.ETH8': {'class_id': 63, 'gateway': 'CFC-866-RETH8', 'channel': 4},
+               'RPAAO.866.02.ETH8': {'class_id': 63, 'gateway': 'CFC-866-RETH8', 'channel': 2},
+               'RFNA.866.02.ETH1':  {'class_id': 63, 'gateway': 'CFC-866-RETH1', 'channel': 2}}
+    monkeypatch.setattr(blender, 'get_device_table', lambda: DeviceTable(devices))
+
+    cursor = fake_pool.acquire.return_value.cursor.return_value.__enter__.return_value
+    cursor.execute.return_value = [('RPAGM.866.04.ETH8', '2', 10, 1), ('RPAGM.866.04.ETH8', '9', 11, 0), ('RPAGM.866.04.ETH8', None, 12, 0)]
+
+    spare_status = blender.get_spare_status('dev')
+
+    assert [s.spare for s in spare_status] == ['RPAAO.866.02.ETH8', '', '']
+    assert spare_status[0].active and not spare_status[1].active
+
+@pytest.mark.parametrize('planner', [blender.plan_op_spare_combo_system, blender.plan_resync_combo_system])
+def test_planner_database_errors_raised_as_runtime_error(monkeypatch, fake_pool, planner):
+    monkeypatch.setattr(blender, 'run_security_checks', lambda operational, spare, db_instance: None)
+    monkeypatch.setattr(blender, '_generate_combo_system_name', lambda operational, spare: f'{operational}_02')
+
+    cursor = fake_pool.acquire.return_value.cursor.return_value.__enter__.return_value
+    cursor.execute.side_effect = blender.cx_Oracle.DatabaseError(FakeOracleError(942, 'ORA-00942: table or view does not exist'))
+
+    with pytest.raises(RuntimeError):
+        planner('RFMAG.866.19.ETH1', 'RFMAG.866.02.ETH1', 'dev')
+
+def _resync_plan():
+    plan = blender.OperationPlan('resync', 'RFMAG.866.19.ETH1', 'RFMAG.866.02.ETH1', 'RFMAG.866.19.ETH1_02', 'dev')
+    plan.combo_sys_id = 5
+    plan.property_updates = [blender.Property(1, 'A', 'op')]
+    return plan
+
+def test_stale_resync_plan_not_applied_to_deleted_combo(monkeypatch, fake_pool):
+    monkeypatch.setattr(blender, '_lock_operational', lambda operational, cursor: None)
+    cursor = fake_pool.acquire.return_value.cursor.return_value.__enter__.return_value
+    cursor.execute.return_value.fetchone.return_value = None
+
+    with pytest.raises(AssertionError):
+        blender.execute_plan(_resync_plan())
+
+    cursor.executemany.assert_not_called()
+    fake_pool.acquire.return_value.commit.assert_not_called()
+
+def test_stale_resync_plan_not_applied_to_changed_combo(monkeypatch, fake_pool):
+    def plan_combo_system(plan, cursor):
+        plan.property_updates = [blender.Property(1, 'A', 'resynced by someone else')]
+
+    monkeypatch.setattr(blender, '_lock_operational', lambda operational, cursor: None)
+    monkeypatch.setattr(blender, '_plan_combo_system', plan_combo_system)
+    cursor = fake_pool.acquire.return_value.cursor.return_value.__enter__.return_value
+    cursor.execute.return_value.fetchone.return_value = (5,)
+
+    with pytest.raises(AssertionError):
+        blender.execute_plan(_resync_plan())
+
+    cursor.executemany.assert_not_called()
+
+def test_resync_plan_applied_while_still_valid(monkeypatch, fake_pool):
+    def plan_combo_system(plan, cursor):
+        plan.property_updates = [blender.Property(1, 'A', 'op')]
+
+    monkeypatch.setattr(blender, '_lock_operational', lambda operational, cursor: None)
+    monkeypatch.setattr(blender, '_plan_combo_system', plan_combo_system)
+    cursor = fake_pool.acquire.return_value.cursor.return_value.__enter__.return_value
+    cursor.execute.return_value.fetchone.return_value = (5,)
+
+    assert blender.execute_plan(_resync_plan()) == 5
+    cursor.executemany.assert_called_once_with(blender.MERGE_SYSTEM_PROPERTY, [(5, 1, 'op')])
+
+class FakeNamesCursor:
+    def __init__(self, systems_properties):
+        self.systems_properties = systems_properties
+        self.name_chunks = list()
+        self.connection = mock.MagicMock()
+        self.connection.gettype.return_value.newobject.side_effect = list
+
+    def execute(self, statement, params):
+        names = params['system_names']
+        self.name_chunks.append(list(names))
+        return iter([(name, prop_name, prop_id, value) for name in sorted(names) for prop_name, prop_id, value in self.systems_properties.get(name, list())])
+
+def test_systems_properties_fetched_in_chunks_and_grouped_by_system(monkeypatch):
+    monkeypatch.setattr(blender, 'BULK_FETCH_MAX_NAMES', 2)
+    cursor = FakeNamesCursor({'A': [('P1', 1, 'a1'), ('P2', 2, 'a2')], 'B': [('P1', 1, 'b1')], 'D': [('P2', 2, 'd2')]})
+
+    systems_properties = list(blender._iter_systems_properties(['D', 'C', 'B', 'A', 'B'], cursor))
+
+    assert cursor.name_chunks == [['A', 'B'], ['C', 'D']]
+    assert [name for name, _ in systems_properties] == ['A', 'B', 'D']
+    assert systems_properties[0][1] == {'P1': blender.Property(1, 'P1', 'a1'), 'P2': blender.Property(2, 'P2', 'a2')}
+    assert blender._get_systems_properties(['A', 'C'], cursor)['C'] == dict()
+
+def test_names_collection_type_looked_up_once_per_connection(fake_pool):
+    with blender._db_connection('dev') as db_connection:
+        cursor = db_connection.cursor()
+        cursor.connection = db_connection
+        blender._new_names_collection(['A'], cursor)
+        blender._new_names_collection(['B'], cursor)
+
+    db_connection.gettype.assert_called_once_with('SYS.ODCIVARCHAR2LIST')
+    assert id(db_connection) not in blender._connection_types
+
+def test_plan_rows_compared_regardless_of_order():
+    plan, current_plan = _resync_plan(), _resync_plan()
+    plan.property_updates = [blender.Property(1, 'A', 'op'), blender.Property(2, 'B', 'op')]
+    current_plan.property_updates = list(reversed(plan.property_updates))
+
+    assert blender._get_plan_rows(plan) == blender._get_plan_rows(current_plan)
+
+def test_work_not_run_when_operational_cannot_be_locked(fake_pool):
+    cursor = fake_pool.acquire.return_value.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = None
+    work_runs = list()
+
+    with pytest.raises(RuntimeError):
+        blender._run_locked('RFMAG.866.19.ETH1', 'dev', work_runs.append)
+
+    assert work_runs == []
+    fake_pool.acquire.return_value.commit.assert_not_called()
+
+def test_planned_spare_id_reset_applied_before_blending(monkeypatch):
+    monkeypatch.setattr(blender.properties, 'fgc_properties', {'DEVICE.SPARE_ID': {}})
+    monkeypatch.setattr(blender, '_get_system_components', lambda system_name, cursor: set())
+    monkeypatch.setattr(blender, '_get_systems_properties', lambda system_names, cursor: {
+        'OP': {'DEVICE.SPARE_ID': blender.Property(1, 'DEVICE.SPARE_ID', '2')},
+        'SPARE': {'DEVICE.SPARE_ID': blender.Property(1, 'DEVICE.SPARE_ID', '0')},
+        'OP_02': dict()})
+
+    plan = blender.OperationPlan('create', 'OP', 'SPARE', 'OP_02', 'dev')
+    plan.reset_spare_id = True
+    blender._plan_combo_system(plan, cursor=None)
+
+    assert plan.property_inserts == [blender.Property(1, 'DEVICE.SPARE_ID', '0')]
+
+def test_streamed_properties_not_bound_by_the_operation_budget(monkeypatch, fake_pool):
+    monkeypatch.setitem(blender._db_timeouts, 'dev', blender.DEFAULT_DB_TIMEOUTS._replace(operation=0.01))
+    cursor = fake_pool.acquire.return_value.cursor.return_value.__enter__.return_value
+    cursor.execute.return_value = [('A', 'P1', 1, '1'), ('B', 'P1', 1, '2')]
+
+    streamed = list()
+    for system_name, _ in blender.get_systems_properties(['A', 'B'], 'dev'):
+        time.sleep(0.02)
+        streamed.append(system_name)
+
+    assert streamed == ['A', 'B']
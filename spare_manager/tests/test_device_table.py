@@ -0,0 +1,38 @@
+import pytest
+
+from spare_manager.device_table import DeviceTable
+
+DEVICES = {
+    'RPAGM.866.04.ETH8': {'class_id': 63, 'gateway': 'CFC-866-RETH8', 'channel': 4},
+    'RPAAO.866.02.ETH8': {'class_id': 63, 'gateway': 'CFC-866-RETH8', 'channel': 2},
+    'RPZES.866.07.ETH8': {'class_id': 62, 'gateway': 'CFC-866-RETH8', 'channel': 7},
+    'RFNA.866.04.ETH1':  {'class_id': 63, 'gateway': 'CFC-866-RETH1', 'channel': 4},
+}
+
+@pytest.fixture
+def device_table():
+    return DeviceTable(DEVICES)
+
+def test_device_data_matches_name_file(device_table):
+    for name, dev_obj in DEVICES.items():
+        row = device_table.get(name)
+        assert (row.class_id, row.gateway, row.channel) == (dev_obj['class_id'], dev_obj['gateway'], dev_obj['channel'])
+
+def test_unknown_device_raises_keyerror(device_table):
+    with pytest.raises(KeyError):
+        device_table.get('RPXXX.000.00.ETH0')
+
+def test_filter_combines_criteria(device_table):
+    assert device_table.filter(class_id=63) == ['RFNA.866.04.ETH1', 'RPAAO.866.02.ETH8', 'RPAGM.866.04.ETH8']
+    assert device_table.filter(class_id=63, gateway='CFC-866-RETH8') == ['RPAAO.866.02.ETH8', 'RPAGM.866.04.ETH8']
+    assert device_table.filter(gateway='CFC-866-RETH8', channel=7) == ['RPZES.866.07.ETH8']
+    assert device_table.filter(gateway='CFC-000-RETH0') == []
+
+def test_find_in_gateway(device_table):
+    assert device_table.find_in_gateway('CFC-866-RETH8', 2) == 'RPAAO.866.02.ETH8'
+    assert device_table.find_in_gateway('CFC-866-RETH8', 9) is None
+
+def test_gateway_filter_only_visits_the_gateway_rows(device_table):
+    assert device_table.filter(gateway='CFC-866-RETH1') == ['RFNA.866.04.ETH1']
+    assert device_table.find_in_gateway('CFC-866-RETH1', 4) == 'RFNA.866.04.ETH1'
+    assert device_table.find_in_gateway('CFC-000-RETH0', 4) is None
@@ -0,0 +1,104 @@
+import logging
+import threading
+
+from spare_manager import profiling
+from spare_manager.profiling import SessionProfiler
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = SessionProfiler()
+
+    with profiler.stage('Outer'):
+        pass
+
+    assert list(profiler.stages) == []
+
+def test_nested_stages_are_recorded_with_their_depth():
+    profiler = SessionProfiler()
+    profiler.enable()
+
+    with profiler.stage('Outer'):
+        with profiler.stage('Inner'):
+            pass
+
+    assert [(s.name, s.depth) for s in profiler.stages] == [('Inner', 1), ('Outer', 0)]
+    assert profiler.stages[1].duration >= profiler.stages[0].duration
+
+def test_timeline_logged_when_outermost_stage_ends(caplog):
+    profiler = SessionProfiler()
+    profiler.enable()
+
+    @profiler.timed('Action')
+    def action(value):
+        return value * 2
+
+    with caplog.at_level(logging.INFO):
+        assert action(21) == 42
+
+    assert 'Timeline:' in caplog.text
+    assert 'Action' in caplog.text
+
+def test_timeline_kept_until_flushed_when_info_not_logged(caplog):
+    profiler = SessionProfiler()
+    profiler.enable()
+
+    with caplog.at_level(logging.WARNING):
+        with profiler.stage('Parse name file'):
+            pass
+
+    assert 'Timeline:' not in caplog.text
+
+    with caplog.at_level(logging.INFO):
+        profiler.flush()
+
+    assert 'Parse name file' in caplog.text
+
+    caplog.clear()
+    with caplog.at_level(logging.INFO):
+        profiler.flush()
+
+    assert caplog.text == ''
+
+def test_only_the_most_recent_stages_are_kept(monkeypatch):
+    monkeypatch.setattr(profiling, 'MAX_STAGES', 3)
+    monkeypatch.setattr(profiling, 'MAX_UNLOGGED_TIMELINES', 2)
+    profiler = SessionProfiler()
+    profiler.enable()
+
+    for index in range(5):
+        with profiler.stage(f'Action {index}'):
+            pass
+
+    assert [s.name for s in profiler.stages] == ['Action 2', 'Action 3', 'Action 4']
+
+def test_cprofile_capture_written_to_file(tmp_path):
+    profiler = SessionProfiler()
+    profiler.enable(capture=True, output_dir=tmp_path)
+
+    output_file = profiler.dump(tmp_path)
+
+    assert output_file.exists()
+    assert profiler.dump(tmp_path) is None
+
+def test_stages_of_concurrent_threads_keep_their_own_depth():
+    profiler = SessionProfiler()
+    profiler.enable()
+    inner_started = threading.Event()
+    outer_may_end = threading.Event()
+
+    def worker():
+        with profiler.stage('Worker'):
+            inner_started.set()
+            outer_may_end.wait(1)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    inner_started.wait(1)
+
+    with profiler.stage('Main'):
+        pass
+
+    outer_may_end.set()
+    thread.join()
+
+    assert sorted((s.name, s.depth) for s in profiler.stages) == [('Main', 0), ('Worker', 0)]
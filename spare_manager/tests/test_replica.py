@@ -0,0 +1,151 @@
+import pytest
+
+import spare_manager.config_blender as blender
+import spare_manager.replica as replica
+
+
+class FakeOracleCursor:
+    def __init__(self, systems, properties, links):
+        self.systems = systems          # sys_id -> (name, is_combo, scn)
+        self.properties = properties    # (sys_id, pro_id) -> (pro_name, value, scn)
+        self.links = links              # (sys_id, cmp_id) -> scn
+        self.statements = list()
+        self.arraysize = 100
+        self._rows = list()
+
+    def execute(self, statement, params):
+        self.statements.append(statement)
+
+        if statement == replica.GET_CHANGED_SYSTEMS:
+            self._rows = [(sys_id, name, is_combo, scn) for sys_id, (name, is_combo, scn) in self.systems.items() if scn > params['watermark']]
+
+        elif statement == replica.GET_SYSTEM_KEYS:
+            self._rows = [(sys_id,) for sys_id in self.systems]
+
+        elif statement == replica.GET_CHANGED_SYSTEM_PROPERTIES:
+            self._rows = [(sys_id, pro_id, name, value, scn) for (sys_id, pro_id), (name, value, scn) in self.properties.items() if scn > params['watermark']]
+
+        elif statement == replica.GET_SYSTEM_PROPERTY_COUNTS:
+            counts = dict()
+            for sys_id, _ in self.properties:
+                counts[sys_id] = counts.get(sys_id, 0) + 1
+            self._rows = list(counts.items())
+
+        elif statement == replica.GET_SYSTEM_PROPERTIES_BY_ID:
+            self._rows = [(sys_id, pro_id, name, value, scn) for (sys_id, pro_id), (name, value, scn) in self.properties.items() if sys_id == params['sys_id']]
+
+        elif statement == replica.GET_SYSTEM_BY_ID:
+            self._rows = [(sys_id, name, is_combo, scn) for sys_id, (name, is_combo, scn) in self.systems.items() if sys_id == params['sys_id']]
+
+        elif statement == replica.GET_CHANGED_COMPONENT_SYSTEMS:
+            self._rows = [(sys_id, cmp_id, scn) for (sys_id, cmp_id), scn in self.links.items() if scn > params['watermark']]
+
+        elif statement == replica.GET_SYSTEM_COMPONENTS_BY_ID:
+            self._rows = [link for link in sorted(self.links) if link[0] == params['sys_id']]
+
+        elif statement == replica.GET_COMPONENT_SYSTEMS:
+            self._rows = sorted(self.links)
+
+        return self
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+@pytest.fixture
+def oracle():
+    systems = {1: ('RPZES.866.01.RPAB', 0, 10), 2: ('RPZES.866.02.RPAB', 0, 10), 3: ('RPZES.866.01.RPAB_02', 1, 12)}
+    properties = {(1, 100): ('DEVICE.SPARE_ID', '0', 10), (3, 100): ('DEVICE.SPARE_ID', '0', 12), (3, 101): ('LIMITS.I.POS', '5', 12)}
+    links = {(3, 7): 12, (3, 8): 12}
+    return FakeOracleCursor(systems, properties, links)
+
+@pytest.fixture
+def local_replica(tmp_path):
+    local_replica = replica.Replica(tmp_path / 'dev.sqlite')
+    yield local_replica
+    local_replica.close()
+
+def _properties(local_replica, system_name):
+    return dict(blender._group_systems_properties(local_replica.get_systems_property_rows([system_name]))).get(system_name, dict())
+
+def test_first_refresh_copies_the_slice(oracle, local_replica):
+    assert not local_replica.is_populated
+
+    local_replica.refresh(oracle)
+
+    assert local_replica.is_populated
+    assert not local_replica.is_stale()
+    assert local_replica.get_combo_systems() == ['RPZES.866.01.RPAB_02']
+    assert local_replica.get_system_id('RPZES.866.02.RPAB') == 2
+    assert local_replica.get_system_id('UNKNOWN') is None
+    assert _properties(local_replica, 'RPZES.866.01.RPAB_02')['LIMITS.I.POS'] == blender.Property(101, 'LIMITS.I.POS', '5')
+
+def test_incremental_refresh_does_not_scan_the_slice(oracle, local_replica):
+    local_replica.refresh(oracle)
+    oracle.statements.clear()
+
+    oracle.properties[(3, 101)] = ('LIMITS.I.POS', '6', 20)
+    oracle.links[(3, 9)] = 20
+
+    assert local_replica.refresh(oracle) == 2
+    assert _properties(local_replica, 'RPZES.866.01.RPAB_02')['LIMITS.I.POS'].value == '6'
+    assert replica.GET_SYSTEM_KEYS not in oracle.statements
+    assert replica.GET_SYSTEM_PROPERTY_COUNTS not in oracle.statements
+    assert replica.GET_COMPONENT_SYSTEMS not in oracle.statements
+
+def test_reconciliation_applies_deletions(oracle, local_replica):
+    local_replica.refresh(oracle)
+
+    del oracle.properties[(1, 100)]
+    del oracle.systems[2]
+    del oracle.links[(3, 8)]
+
+    assert local_replica.refresh(oracle) == 0
+    assert local_replica.refresh(oracle, reconcile=True) == 3
+    assert local_replica.refresh(oracle, reconcile=True) == 0
+
+    assert _properties(local_replica, 'RPZES.866.01.RPAB') == dict()
+    assert local_replica.get_system_id('RPZES.866.02.RPAB') is None
+
+def test_invalidated_systems_fetched_again_with_their_combos(oracle, local_replica):
+    local_replica.refresh(oracle)
+
+    del oracle.properties[(3, 101)]
+    del oracle.links[(3, 8)]
+    local_replica.invalidate(['RPZES.866.01.RPAB'])
+    local_replica.refresh(oracle)
+
+    assert 'LIMITS.I.POS' not in _properties(local_replica, 'RPZES.866.01.RPAB_02')
+    assert replica.GET_SYSTEM_KEYS not in oracle.statements
+
+def test_unknown_systems(oracle, local_replica):
+    local_replica.refresh(oracle)
+
+    assert local_replica.get_unknown_systems(['RPZES.866.01.RPAB', 'RFNA.866.01.ETH1']) == {'RFNA.866.01.ETH1'}
+
+def test_invalidate_forces_a_refresh(oracle, local_replica):
+    local_replica.refresh(oracle)
+    local_replica.invalidate()
+
+    assert local_replica.is_stale()
+
+def test_replica_disabled_by_default(monkeypatch):
+    monkeypatch.delenv(replica.REPLICA_DIR_ENV_VAR, raising=False)
+
+    assert replica.get_replica('dev') is None
+
+def test_systems_outside_the_replica_read_from_oracle(monkeypatch, oracle, local_replica, fake_db_connection):
+    def iter_systems_properties(system_names, cursor):
+        for system_name in system_names:
+            yield system_name, {'A': blender.Property(1, 'A', 'oracle')}
+
+    local_replica.refresh(oracle)
+    monkeypatch.setattr(blender, '_get_fresh_replica', lambda db_instance: local_replica)
+    monkeypatch.setattr(blender, '_iter_systems_properties', iter_systems_properties)
+
+    systems_properties = dict(blender.get_systems_properties(['RPZES.866.01.RPAB', 'RFNA.866.01.ETH1'], 'dev'))
+
+    assert systems_properties['RPZES.866.01.RPAB']['DEVICE.SPARE_ID'].value == '0'
+    assert systems_properties['RFNA.866.01.ETH1']['A'].value == 'oracle'
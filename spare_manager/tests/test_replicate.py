@@ -0,0 +1,67 @@
+from unittest import mock
+
+import pytest
+
+import spare_manager.config_blender as blender
+import spare_manager.replicate as replicate
+
+
+def test_properties_matched_by_name_not_id():
+    source = {'A': blender.Property(10, 'A', '1'), 'B': blender.Property(11, 'B', '2')}
+    target = {'A': blender.Property(20, 'A', '1'), 'B': blender.Property(21, 'B', '0'), 'C': blender.Property(22, 'C', '3')}
+
+    to_merge, to_delete = replicate._diff_properties_by_name(source, target)
+
+    assert [p.name for p in to_merge] == ['B']
+    assert [(p.name, p.id) for p in to_delete] == [('C', 22)]
+
+def test_replication_into_same_instance_refused():
+    with pytest.raises(ValueError):
+        replicate.replicate_combo_systems('dev', 'DEV')
+
+def test_replication_into_production_must_be_allowed():
+    with pytest.raises(ValueError):
+        replicate.replicate_combo_systems('dev', 'pro')
+
+@pytest.fixture
+def chunk_data(monkeypatch):
+    source_cursor, target_cursor = mock.MagicMock(), mock.MagicMock()
+    links = {id(source_cursor): {('OP_01', 7), ('OP_01', 8), ('OP_02', 7)}, id(target_cursor): {('OP_01', 7), ('OP_01', 9)}}
+    properties = {
+        id(source_cursor): {'OP_01': {'A': blender.Property(10, 'A', '1'), 'NEW': blender.Property(12, 'NEW', '3')},
+                            'OP_02': {'A': blender.Property(10, 'A', '2')}},
+        id(target_cursor): {'OP_01': {'A': blender.Property(20, 'A', '0'), 'OLD': blender.Property(21, 'OLD', '1')},
+                            'OP_02': dict()},
+    }
+
+    monkeypatch.setattr(replicate, '_get_systems_components', lambda names, cursor: links[id(cursor)])
+    monkeypatch.setattr(blender, '_get_systems_properties', lambda names, cursor: properties[id(cursor)])
+    monkeypatch.setattr(replicate, '_get_system_ids', lambda names, cursor: {'OP_01': 1, 'OP_02': 2})
+    monkeypatch.setattr(replicate, '_get_property_ids', lambda names, cursor: {'A': 20})
+
+    return source_cursor, target_cursor
+
+def _writes(target_cursor):
+    return {call.args[0]: call.args[1] for call in target_cursor.executemany.call_args_list}
+
+def test_chunk_writes_combos_links_and_properties_together(chunk_data):
+    source_cursor, target_cursor = chunk_data
+    new_combo = replicate.ComboSystem('OP_02', 2, 5, 63)
+
+    report = replicate._replicate_chunk(['OP_01', 'OP_02'], [new_combo], source_cursor, target_cursor, dry_run=False)
+
+    assert report == replicate.ReplicationReport(1, 2, 1, 2, 1, ['NEW'])
+    writes = _writes(target_cursor)
+    assert writes[replicate.INSERT_REPLICATED_COMBO_SYSTEM] == [('OP_02', 5, 63)]
+    assert writes[blender.LINK_COMPONENT_TO_SYSTEM] == [(1, 8), (2, 7)]
+    assert writes[blender.UNLINK_COMPONENT_FROM_SYSTEM] == [(1, 9)]
+    assert writes[blender.MERGE_SYSTEM_PROPERTY] == [(1, 20, '1'), (2, 20, '2')]
+    assert writes[blender.DELETE_SYSTEM_PROPERTY] == [(1, 21)]
+
+def test_chunk_dry_run_writes_nothing(chunk_data):
+    source_cursor, target_cursor = chunk_data
+
+    report = replicate._replicate_chunk(['OP_01', 'OP_02'], [], source_cursor, target_cursor, dry_run=True)
+
+    assert report.unmatched_properties == ['NEW']
+    target_cursor.executemany.assert_not_called()
@@ -0,0 +1,33 @@
+import spare_manager.config_blender as blender
+import spare_manager.spare_allocator as allocator
+from spare_manager.device_table import DeviceTable
+
+DEVICES = {
+    'RPAGM.866.04.ETH8': {'class_id': 63, 'gateway': 'CFC-866-RETH8', 'channel': 4},
+    'RPAAO.866.02.ETH8': {'class_id': 63, 'gateway': 'CFC-866-RETH8', 'channel': 2},
+    'RPAAO.866.03.ETH8': {'class_id': 63, 'gateway': 'CFC-866-RETH8', 'channel': 3},
+    'RPAAO.866.05.ETH8': {'class_id': 63, 'gateway': 'CFC-866-RETH8', 'channel': 5},
+    'RPZES.866.07.ETH8': {'class_id': 62, 'gateway': 'CFC-866-RETH8', 'channel': 7},
+    'RFNA.866.04.ETH1':  {'class_id': 63, 'gateway': 'CFC-866-RETH1', 'channel': 4},
+}
+
+def test_compatible_spares_share_class_and_gateway(monkeypatch):
+    monkeypatch.setattr(allocator, 'get_device_table', lambda: DeviceTable(DEVICES))
+
+    assert allocator.get_compatible_spares('RPAGM.866.04.ETH8') == ['RPAAO.866.02.ETH8', 'RPAAO.866.03.ETH8', 'RPAAO.866.05.ETH8']
+
+def test_free_spares_without_combo_ranked_first(monkeypatch, fake_db_connection):
+    device_table = DeviceTable(DEVICES)
+    monkeypatch.setattr(allocator, 'get_device_table', lambda: device_table)
+    monkeypatch.setattr(blender, 'get_device_table', lambda: device_table)
+    monkeypatch.setattr(allocator, '_get_spare_usage', lambda names, cursor: [
+        ('RPAGM.866.04.ETH8_02', 1, None),
+        ('RPAGM.866.04.ETH8', 0, '0'),
+        ('RPAAO.866.05.ETH8', 0, '03'),
+    ])
+
+    candidates = allocator.recommend_spares('RPAGM.866.04.ETH8', 'dev')
+
+    assert [c.name for c in candidates] == ['RPAAO.866.05.ETH8', 'RPAAO.866.02.ETH8', 'RPAAO.866.03.ETH8']
+    assert candidates[1].combo_exists
+    assert candidates[2].in_use_by == 'RPAAO.866.05.ETH8'
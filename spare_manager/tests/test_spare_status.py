@@ -0,0 +1,23 @@
+from spare_manager.config_blender import SpareStatus
+from spare_manager.spare_status import filter_spare_status, format_spare_status
+
+SPARE_STATUS = [
+    SpareStatus('RFMAG.866.19.ETH1', 'RFNA.866.04.ETH1', 1234, True),
+    SpareStatus('RPAGM.866.04.ETH8', 'RPAAO.866.02.ETH8', 1235, False),
+    SpareStatus('RPAGM.866.05.ETH8', '', 1236, False),
+]
+
+def test_filter_active_only():
+    assert filter_spare_status(SPARE_STATUS, active_only=True) == SPARE_STATUS[:1]
+
+def test_filter_matches_operational_or_spare():
+    assert filter_spare_status(SPARE_STATUS, pattern='rpaao') == SPARE_STATUS[1:2]
+    assert filter_spare_status(SPARE_STATUS, pattern='RPAGM') == SPARE_STATUS[1:]
+
+def test_format_has_one_line_per_configuration_plus_header():
+    lines = format_spare_status(SPARE_STATUS).splitlines()
+
+    assert len(lines) == len(SPARE_STATUS) + 1
+    assert lines[0].startswith('OPERATIONAL')
+    assert 'YES' in lines[1]
+    assert '?' in lines[3]
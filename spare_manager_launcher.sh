@@ -24,8 +24,8 @@ is_python_venv_active()
     PYTHON_VENV_ACTIVE=$(python3 -c "$PYTHON_COMMAND")
 }
 
-if [ $# -ne 1 ]; then
-    echo "Missing input argument [-c|-a]"
+if [ $# -lt 1 ]; then
+    echo "Missing input argument [-c|-a|-s] [-p|-P]"
     exit
 fi
 
@@ -38,11 +38,13 @@ if [ "${PYTHON_VENV_ACTIVE}" != 1 ]; then
 fi
 
 if [ "$1" = "-c" ]; then 
-    python3 ${SM_HOME}/${SM_VENV_DIR_NAME}/lib64/python3.6/site-packages/${SM_DIR_NAME}/sm_main.py -c &
+    python3 ${SM_HOME}/${SM_VENV_DIR_NAME}/lib64/python3.6/site-packages/${SM_DIR_NAME}/sm_main.py -c $2 &
 elif [ "$1" == "-a" ]; then 
-    python3 ${SM_HOME}/${SM_VENV_DIR_NAME}/lib64/python3.6/site-packages/${SM_DIR_NAME}/sm_main.py -a &
+    python3 ${SM_HOME}/${SM_VENV_DIR_NAME}/lib64/python3.6/site-packages/${SM_DIR_NAME}/sm_main.py -a $2 &
+elif [ "$1" == "-s" ]; then 
+    python3 ${SM_HOME}/${SM_VENV_DIR_NAME}/lib64/python3.6/site-packages/${SM_DIR_NAME}/sm_main.py -s $2 &
 else
-    echo "Unrecognized argument! Valid arguements: -c|-a"
+    echo "Unrecognized argument! Valid arguements: -c|-a|-s"
     exit
 fi
 